@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_file(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+# ==================== ОПТИМИЗИРОВАННЫЕ КАРТИНКИ ====================
+class AssetIndex:
+    """Индекс пережатых вариантов картинок колоды (собирает tools/build_assets.py).
+
+    Для каждой картинки выбирается самый маленький вариант, файл которого
+    на месте и совпадает по размеру с записью в индексе. Если исходник
+    изменился после сборки (не совпал sha256) или индекса нет вовсе,
+    отправляется сам исходник.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = Path(index_file)
+        self.variants = {}     # {исходник: лучший вариант}
+        self.bytes_saved = {}  # {исходник: сколько байт экономит вариант}
+        self.stale = ()        # исходники, изменившиеся после сборки
+        self._stamp = None
+        self.load()
+
+    def _index_stamp(self):
+        try:
+            stat = self.index_file.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        self._stamp = self._index_stamp()
+        if self._stamp is None:
+            self.variants, self.bytes_saved, self.stale = {}, {}, ()
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                entries = json.load(f)["sources"]
+        except Exception as e:
+            logger.error("Ошибка загрузки индекса картинок %s: %s", self.index_file, e)
+            return
+
+        variants, bytes_saved, stale = {}, {}, []
+        for source_name, entry in entries.items():
+            source = Path(source_name)
+            try:
+                if sha256_file(source) != entry["source_sha256"]:
+                    stale.append(source)
+                    continue
+            except OSError:
+                continue
+            best = None
+            for variant in entry["variants"]:
+                path = self.index_file.parent / variant["file"]
+                try:
+                    valid = path.stat().st_size == variant["bytes"]
+                except OSError:
+                    valid = False
+                if valid and variant["bytes"] < entry["source_bytes"] and (best is None or variant["bytes"] < best[1]):
+                    best = (path, variant["bytes"])
+            if best is not None:
+                variants[source] = best[0]
+                bytes_saved[source] = entry["source_bytes"] - best[1]
+
+        self.variants, self.bytes_saved, self.stale = variants, bytes_saved, tuple(stale)
+        for source in self.stale:
+            logger.warning("⚠️ %s изменился после сборки вариантов - отправляем исходник", source)
+        for source, saved in sorted(self.bytes_saved.items()):
+            logger.debug("🖼 %s: %s, экономия %.0f КБ", source.name, self.variants[source].name, saved / 1024)
+        if variants:
+            logger.info(
+                "🖼 Оптимизированных картинок: %s, экономия на загрузку %.0f КБ",
+                len(variants), self.total_bytes_saved / 1024,
+            )
+
+    @property
+    def total_bytes_saved(self):
+        return sum(self.bytes_saved.values())
+
+    def resolve(self, path):
+        """Что отправлять вместо картинки path"""
+        return self.variants.get(Path(path), path)
+
+    async def watch(self, interval):
+        """Фоновый опрос индекса: после пересборки варианты подхватываются без перезапуска"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self._index_stamp() != self._stamp:
+                    logger.info("🔄 Индекс картинок изменился, перечитываем")
+                    await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.error("Ошибка обновления индекса картинок: %s", e)
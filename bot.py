@@ -1,276 +1,313 @@
 import asyncio
 import os
-import random
-import json
 import logging
+import time
 from pathlib import Path
-from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, InputMediaPhoto
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest
 from dotenv import load_dotenv
 
-# ==================== НАСТРОЙКА ЛОГИРОВАНИЯ ====================
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%H:%M:%S"
+from assets import AssetIndex
+from catalog import CardCatalog
+from daily import current_day, daily_seeds
+from debounce import PressDebouncer
+from drain import UpdateDrain
+from file_cache import FileIdCache, ensure_uploaded, is_file_id_rejected, warm_up
+from i18n import Localization, RenderCache
+from inline import InlinePool
+from logs import CorrelationMiddleware, sampling_filter
+from logs import setup_logging as setup_queue_logging
+from metrics import (
+    ApiMetricsMiddleware, HandlerMetricsMiddleware, Metrics, UpdateStats, instrument_send_photo, process_rss_bytes
 )
+from sampler import PredictionSampler
+from snapshot import SnapshotError, read_snapshot, write_snapshot
+from scheduler import SendScheduler
+from spreads import SPREADS, fit_caption
+from storage import create_storage
+
 logger = logging.getLogger(__name__)
 
-# ==================== ЗАГРУЗКА ТОКЕНА ====================
-load_dotenv()
-TOKEN = os.getenv("BOT_TOKEN")
+# ==================== НАСТРОЙКИ ====================
+def parse_chat_id(value):
+    """id чата из окружения: число, а @username канала - как есть"""
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+class Config:
+    """Настройки из переменных окружения.
+
+    Читаются при сборке приложения, а не при импорте модуля, поэтому
+    bot.py можно импортировать без токена (инструменты, бенчмарки).
+    """
+
+    def __init__(self, env=None):
+        env = os.environ if env is None else env
+        self.token = env.get("BOT_TOKEN")
+        if not self.token:
+            raise ValueError("❌ BOT_TOKEN не найден! Добавь его в .env")
 
-if not TOKEN:
-    raise ValueError("❌ BOT_TOKEN не найден! Добавь его в .env")
+        # Адрес Bot API можно подменить (локальный сервер или фейк для тестов)
+        self.telegram_api_url = env.get("TELEGRAM_API_URL")
+        # Служебный чат для предзагрузки колоды и флаг прогрева при старте
+        self.service_chat_id = parse_chat_id(env.get("SERVICE_CHAT_ID"))
+        self.warm_up_cache = env.get("WARM_UP_CACHE", "0") == "1"
+        # Как часто (в секундах) проверять, не изменились ли папки с картинками
+        self.catalog_poll_interval = float(env.get("CATALOG_POLL_INTERVAL", "30"))
+        # Хранилище состояния: sqlite (по умолчанию) или memory
+        self.storage_kind = env.get("STORAGE", "sqlite")
+        self.storage_flush_interval = float(env.get("STORAGE_FLUSH_INTERVAL", "2"))
+        # Планировщик исходящих запросов с учётом лимитов Telegram
+        self.send_scheduler = env.get("SEND_SCHEDULER", "1") == "1"
+        self.global_rate_limit = float(env.get("GLOBAL_RATE_LIMIT", "30"))       # запросов в секунду на бота
+        self.group_rate_limit = float(env.get("GROUP_RATE_LIMIT", "20")) / 60    # сообщений в секунду на группу
+        # Пауза "карта открывается" перед показом карты, 0 - без паузы
+        self.reveal_delay = float(env.get("REVEAL_DELAY", "1"))
+        # Порт HTTP-эндпоинта /metrics; не задан - метрики выключены
+        self.metrics_host = env.get("METRICS_HOST", "127.0.0.1")
+        self.metrics_port = env.get("METRICS_PORT")
+        # Номер и число рабочих процессов в режиме webhook (см. webhook.py)
+        self.worker_index = int(env.get("WORKER_INDEX", "0"))
+        self.worker_count = int(env.get("WORKER_COUNT", "1"))
+        # Файлы состояния: кэш file_id и база языков и истории
+        self.data_dir = Path(env.get("DATA_DIR", "./data"))
+        self.file_id_cache_file = self.data_dir / "file_ids.json"
+        self.state_db_file = self.data_dir / "state.sqlite3"
+        # Снимок языков и истории, который воркер пишет при остановке и читает при запуске
+        self.snapshot_file = self.data_dir / f"snapshot.{self.worker_index}.bin"
+        # Сколько секунд при остановке ждать начатые апдейты и очередь отправки
+        self.drain_timeout = float(env.get("DRAIN_TIMEOUT", "10"))
+        # Индекс пережатых картинок (python -m tools.build_assets); нет файла - шлём исходники
+        self.asset_index_file = Path(env.get("ASSET_INDEX", "images/variants/index.json"))
 
-bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-dp = Dispatcher()
+        # Языки пользователей и история предсказаний переживают перезапуск.
+        # Если процессов несколько, язык мог поменять соседний воркер - кэш
+        # языков в каждом процессе живёт недолго.
+        self.language_cache_ttl = self.storage_flush_interval * 2 if self.worker_count > 1 else None
+        # Сколько пользователей и чатов держать в памяти; самые давние вытесняются
+        self.max_languages = int(env.get("MAX_CACHED_LANGUAGES", "100000"))
+        self.max_history_chats = int(env.get("MAX_HISTORY_CHATS", "100000"))
+        # Не чаще одного /tarot от пользователя в чате за столько секунд, 0 - без паузы
+        self.tarot_cooldown = float(env.get("TAROT_COOLDOWN", "5"))
+        # Режим "карта дня": карта и предсказание зависят только от пользователя,
+        # даты и колоды, без истории; день меняется в полночь по UTC+DAILY_UTC_OFFSET
+        self.card_of_the_day = env.get("CARD_OF_THE_DAY", "0") == "1"
+        self.daily_utc_offset = float(env.get("DAILY_UTC_OFFSET", "3"))
+        # Inline-режим: сколько карт в ответе и сколько секунд Telegram кэширует ответ пользователю
+        self.inline_results = int(env.get("INLINE_RESULTS", "8"))
+        self.inline_cache_time = int(env.get("INLINE_CACHE_TIME", "300"))
+        # Фоновая чистка истории: период, с, и длина одной порции, мс
+        self.history_sweep_interval = float(env.get("HISTORY_SWEEP_INTERVAL", "30"))
+        self.history_sweep_slice = float(env.get("HISTORY_SWEEP_SLICE_MS", "5")) / 1000
 
 # ==================== ПУТИ К ФАЙЛАМ ====================
 BACKS_DIR = Path("./images/backs")
 OPEN_DIR = Path("./images/open")
 PREDICTIONS_FILE = Path("predictions.json")
+LOCALES_DIR = Path("./locales")
 
-BACKS_DIR.mkdir(parents=True, exist_ok=True)
-OPEN_DIR.mkdir(parents=True, exist_ok=True)
+# Предсказания, выпавшие в чате за последний CACHE_DURATION, не повторяются
+CACHE_DURATION = 3600
 
-# ==================== СИСТЕМА ЯЗЫКОВ ====================
-user_languages = {}  # {user_id: 'ru'/'en'}
-
-TEXTS = {
-    "ru": {
-        "start": "Привет! Я бот Таро 🔮\n\nУзнай своё предсказание на сегодняшний день!\n\nИспользуй команду /tarot, чтобы получить предсказание!",
-        "welcome": "👋 Добро пожаловать! Выберите язык: \n\n 👋 Welcome! Choose your language:",
-        "language_set": "✅ Язык установлен: Русский",
-        "choose_card": "🔮 Выбери карту судьбы (1-4):",
-        "user_chooses": "🔮 {username} выбирает карту судьбы! Нажми кнопку (1-4):",
-        "card_opening": "🔮 Карта открывается...",
-        "your_card": "🎴 Твоя карта дня\n\n{prediction}\n\n✨ Используй /tarot для нового расклада!",
-        "cards_unavailable": "❌ Карты временно недоступны.",
-        "no_predictions": "❌ Бот не настроен. Файл с предсказаниями не найден.",
-        "no_cards_files": "❌ Нет доступных карт с предсказаниями.",
-        "error_loading": "❌ Ошибка загрузки карт",
-        "help": "🔮 Бот Таро - Помощь:\n\n/start - Начать работу\n/tarot - Получить предсказание\n/language - Сменить язык\n/help - Эта справка\n/stats - Статистика бота\n/cards - Список карт\n\n💡 Бота можно добавлять в группы!",
-        "stats": "📊 Статистика бота:\n\n🔙 Рубашек: {backs_count}\n🎴 Всего карт: {all_cards_count}\n✅ Карт с предсказаниями: {available_cards_count}\n📜 Предсказаний: {predictions_count}\n💬 Активных чатов: {active_chats}\n🕒 Кэшированных предсказаний: {total_cached_predictions}",
-        "cards_list": "📋 Карты с предсказаниями:\n\n{cards_list}\n\n✅ - есть файл карты\n❌ - файл карты не найден",
-        "history_cleared": "✅ История предсказаний очищена! Удалено {count} записей.",
-        "history_empty": "ℹ️ История предсказаний уже пуста",
-        "no_predictions_loaded": "❌ Нет загруженных предсказаний"
-    },
-    "en": {
-        "start": "Hello! I'm a Tarot bot 🔮\n\nFind out your prediction for today!\n\n Use the /tarot command to get a prediction!",
-        "welcome": "👋 Welcome! Choose your language: \n\n 👋 Добро пожаловать! Выберите язык:",
-        "language_set": "✅ Language set: English",
-        "choose_card": "🔮 Choose your fate card (1-4):",
-        "user_chooses": "🔮 {username} is choosing a fate card! Press a button (1-4):",
-        "card_opening": "🔮 The card is opening...",
-        "your_card": "🎴 Your card of the day\n\n{prediction}\n\n✨ Use /tarot for a new reading!",
-        "cards_unavailable": "❌ Cards are temporarily unavailable.",
-        "no_predictions": "❌ Bot is not configured. Prediction file not found.",
-        "no_cards_files": "❌ No available cards with predictions.",
-        "error_loading": "❌ Error loading cards",
-        "help": "🔮 Tarot Bot - Help:\n\n/start - Start\n/tarot - Get prediction\n/language - Change language\n/help - This help\n/stats - Bot statistics\n/cards - List of cards\n\n💡 You can add the bot to groups!",
-        "stats": "📊 Bot statistics:\n\n🔙 Card backs: {backs_count}\n🎴 Total cards: {all_cards_count}\n✅ Cards with predictions: {available_cards_count}\n📜 Predictions: {predictions_count}\n💬 Active chats: {active_chats}\n🕒 Cached predictions: {total_cached_predictions}",
-        "cards_list": "📋 Cards with predictions:\n\n{cards_list}\n\n✅ - card file exists\n❌ - card file not found",
-        "history_cleared": "✅ Prediction history cleared! Deleted {count} records.",
-        "history_empty": "ℹ️ Prediction history is already empty",
-        "no_predictions_loaded": "❌ No predictions loaded"
-    }
-}
+# ==================== СОСТОЯНИЕ ПРИЛОЖЕНИЯ ====================
+# Заполняется в create_app() и load_resources(), до этого импорт модуля
+# ничего не делает: не читает .env, не создаёт Bot и не трогает диск
+config = None
+bot = None
+dp = None
+send_scheduler = None
+metrics = None
+file_cache = None
+storage = None
+i18n = None
+sampler = None
+catalog = None
+assets = None
+inline_pool = None
+inline_refresh = None
+debouncer = None
+update_stats = None
+update_drain = None
+# Готовые тексты /stats (часть про колоду) и /cards по языкам, сбрасываются при пересборке каталога
+stats_cache = RenderCache()
+cards_cache = RenderCache()
+# Сколько секунд заняли этапы холодного старта
+startup_timings = {}
+
+# Все обработчики висят на роутере, диспетчер собирается в create_app()
+router = Router()
 
+# ==================== СИСТЕМА ЯЗЫКОВ ====================
+# Тексты лежат в locales/<язык>.json, новый язык - новый файл
 def get_user_language(user_id):
     """Получаем язык пользователя, по умолчанию русский"""
-    return user_languages.get(user_id, "ru")
+    return storage.get_language(user_id) or i18n.default_language
 
 def get_text(text_key, user_id, **kwargs):
     """Получаем текст на языке пользователя"""
-    lang = get_user_language(user_id)
-    text = TEXTS[lang].get(text_key, text_key)
-    return text.format(**kwargs) if kwargs else text
-
-# ==================== СИСТЕМА КЭШИРОВАНИЯ ====================
-prediction_history = {}
-CACHE_DURATION = 3600
-
-def cleanup_old_predictions():
-    global prediction_history
-    current_time = asyncio.get_event_loop().time()
-    
-    for chat_id in list(prediction_history.keys()):
-        prediction_history[chat_id] = [
-            pred for pred in prediction_history[chat_id]
-            if current_time - pred['timestamp'] < CACHE_DURATION
-        ]
-        
-        if not prediction_history[chat_id]:
-            del prediction_history[chat_id]
+    return i18n.text(get_user_language(user_id), text_key, **kwargs)
 
-# ==================== ЗАГРУЗКА ПРЕДСКАЗАНИЙ ====================
-def load_predictions():
-    if PREDICTIONS_FILE.exists():
-        try:
-            with open(PREDICTIONS_FILE, "r", encoding="utf-8") as f:
-                predictions = json.load(f)
-                
-                if not predictions:
-                    logger.error("Файл predictions.json пустой!")
-                    return {}
-                
-                # Проверяем новую структуру
-                first_card = list(predictions.values())[0]
-                if isinstance(first_card, dict) and 'ru' in first_card:
-                    logger.info("✅ Загружены мультиязычные предсказания")
-                else:
-                    logger.warning("❌ Старая структура предсказаний! Нужно обновить до мультиязычной")
-                
-                card_names = list(predictions.keys())
-                logger.info(f"✅ Загружены предсказания для карт: {', '.join(card_names)}")
-                
-                return predictions
-                
-        except Exception as e:
-            logger.error(f"Ошибка загрузки predictions: {e}")
-            return {}
-    
-    logger.error("❌ Файл predictions.json не найден!")
-    return {}
-
-PREDICTIONS = load_predictions()
-
-# ==================== РАБОТА С ФАЙЛАМИ ====================
-def get_images_from_folder(folder_path):
-    extensions = ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.bmp']
-    images = []
-    for ext in extensions:
-        images.extend(folder_path.glob(ext))
-        images.extend(folder_path.glob(ext.upper()))
-    return images
-
-def get_available_cards():
-    """Получаем карты, для которых ЕСТЬ предсказания"""
-    all_cards = get_images_from_folder(OPEN_DIR)
-    available_cards = []
-    
-    for card in all_cards:
-        card_name = card.stem.lower()
-        if card_name in PREDICTIONS:
-            available_cards.append(card)
-        else:
-            logger.warning(f"❌ Для карты '{card_name}' нет предсказаний в файле")
-    
-    logger.info(f"🎴 Доступно карт с предсказаниями: {len(available_cards)}")
-    return available_cards
+# Клавиатуры не меняются - собираем их один раз
+CARD_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="1", callback_data="card_1"),
+        InlineKeyboardButton(text="2", callback_data="card_2"),
+    ],
+    [
+        InlineKeyboardButton(text="3", callback_data="card_3"),
+        InlineKeyboardButton(text="4", callback_data="card_4"),
+    ]
+])
 
+# ==================== ПРЕДСКАЗАНИЯ ====================
+# Каталог держит и картинки, и таблицу предсказаний; predictions.json
+# перечитывается на лету, когда файл меняется
 def get_unique_prediction_for_card(card_filename, chat_id, user_id):
-    global prediction_history
-    cleanup_old_predictions()
-    
     card_name = card_filename.stem.lower()
     user_lang = get_user_language(user_id)
     
     # Проверяем есть ли предсказания для этой карты
-    if card_name not in PREDICTIONS:
-        logger.error(f"❌ Нет предсказаний для карты: {card_name}")
+    if card_name not in catalog.predictions:
+        logger.error("❌ Нет предсказаний для карты: %s", card_name)
         return get_text("no_predictions", user_id)
     
-    card_data = PREDICTIONS[card_name]
-    
-    # Поддерживаем как старую, так и новую структуру
-    if isinstance(card_data, dict):
-        # Новая структура: {"ru": [...], "en": [...]}
-        if user_lang not in card_data:
-            # Если нет предсказаний на языке пользователя, используем русский
-            user_lang = "ru"
-        all_predictions = card_data.get(user_lang, [])
-    else:
-        # Старая структура: ["предсказание1", "предсказание2"]
-        all_predictions = card_data
+    # Если нет предсказаний на языке пользователя, таблица вернёт русские
+    user_lang, all_predictions = catalog.predictions.lookup(card_name, user_lang)
     
     if not all_predictions:
-        logger.error(f"❌ Пустой список предсказаний для карты: {card_name}")
+        logger.error("❌ Пустой список предсказаний для карты: %s", card_name)
         return get_text("no_predictions", user_id)
     
-    # Получаем уже использованные предсказания
-    used_predictions = set()
-    if chat_id in prediction_history:
-        for pred_data in prediction_history[chat_id]:
-            if pred_data['card'] == card_name and pred_data['language'] == user_lang:
-                used_predictions.add(pred_data['text'])
-    
-    # Доступные предсказания
-    available_predictions = [p for p in all_predictions if p not in used_predictions]
-    
-    # Если все предсказания использовались, сбрасываем историю для этой карты
-    if not available_predictions:
-        available_predictions = all_predictions
-        if chat_id in prediction_history:
-            prediction_history[chat_id] = [
-                pred for pred in prediction_history[chat_id]
-                if not (pred['card'] == card_name and pred['language'] == user_lang)
-            ]
-    
-    selected_prediction = random.choice(available_predictions)
-    
-    # Сохраняем в историю
-    if chat_id not in prediction_history:
-        prediction_history[chat_id] = []
-    
-    prediction_history[chat_id].append({
-        'card': card_name,
-        'text': selected_prediction,
-        'language': user_lang,
-        'timestamp': asyncio.get_event_loop().time()
-    })
+    # Выбираем предсказание, которое ещё не выпадало в этом чате
+    index = sampler.draw(chat_id, card_name, user_lang, len(all_predictions))
+    selected_prediction = all_predictions[index]
     
     return selected_prediction
 
+def get_card_of_the_day(user_id):
+    """(карта, предсказание) на сегодня: одинаковы весь день и на любом воркере"""
+    card_seed, prediction_seed = daily_seeds(user_id, current_day(config.daily_utc_offset), catalog.deck_key)
+    card = catalog.cards[card_seed % len(catalog.cards)]
+    _, predictions = catalog.predictions.lookup(card.stem.lower(), get_user_language(user_id))
+    if not predictions:
+        return card, get_text("no_predictions", user_id)
+    return card, predictions[prediction_seed % len(predictions)]
+
+def prediction_count(card_name, lang):
+    """Сколько предсказаний у карты на языке (для восстановления истории)"""
+    return catalog.prediction_counts.get(card_name, {}).get(lang, 0)
+
 # ==================== ОТПРАВКА ФОТО ====================
-async def send_photo_safe(chat_id, photo_path, caption="", reply_markup=None, reply_to_message_id=None):
+async def _send_photo_safe(chat_id, photo_path, caption="", reply_markup=None, reply_to_message_id=None):
+    # Вместо исходника шлём самый маленький собранный вариант картинки
+    photo_path = assets.resolve(photo_path)
+    
+    # Если картинка уже загружалась - отправляем по file_id без повторной загрузки
+    file_id = file_cache.get(photo_path)
+    if file_id:
+        try:
+            await bot.send_photo(
+                chat_id=chat_id,
+                photo=file_id,
+                caption=caption,
+                reply_markup=reply_markup,
+                reply_to_message_id=reply_to_message_id
+            )
+            return True
+        except TelegramBadRequest as e:
+            if not is_file_id_rejected(e):
+                logger.error("Ошибка отправки фото %s: %s", photo_path, e)
+                return False
+            logger.warning("♻️ file_id для %s отклонён, загружаем заново: %s", photo_path, e)
+            file_cache.invalidate(photo_path)
+        except Exception as e:
+            logger.error("Ошибка отправки фото %s: %s", photo_path, e)
+            return False
+
     try:
-        await bot.send_photo(
+        sent = await bot.send_photo(
             chat_id=chat_id,
             photo=FSInputFile(photo_path),
             caption=caption,
             reply_markup=reply_markup,
             reply_to_message_id=reply_to_message_id
         )
+        if sent.photo:
+            file_cache.put(photo_path, sent.photo[-1].file_id)
         return True
     except Exception as e:
-        logger.error(f"Ошибка отправки фото {photo_path}: {e}")
+        logger.error("Ошибка отправки фото %s: %s", photo_path, e)
         return False
 
+# С METRICS_PORT create_app() подменяет её обёрткой с замером времени
+send_photo_safe = _send_photo_safe
+
+async def send_media_group_safe(chat_id, photos, reply_to_message_id=None):
+    """Несколько фото одним sendMediaGroup; photos - [(путь, подпись)].
+
+    Уже загруженные картинки уходят по file_id, остальные файлом; file_id
+    новых загрузок запоминаются из ответа.
+    """
+    paths = [assets.resolve(path) for path, _ in photos]
+    file_ids = [file_cache.get(path) for path in paths]
+    
+    for attempt in range(2):
+        media = [
+            InputMediaPhoto(media=file_id or FSInputFile(path), caption=fit_caption(caption))
+            for path, file_id, (_, caption) in zip(paths, file_ids, photos)
+        ]
+        try:
+            sent = await bot.send_media_group(chat_id=chat_id, media=media, reply_to_message_id=reply_to_message_id)
+        except TelegramBadRequest as e:
+            if attempt or not any(file_ids) or not is_file_id_rejected(e):
+                logger.error("Ошибка отправки альбома: %s", e)
+                return False
+            # Какой из file_id отклонён, неизвестно - загружаем все заново
+            logger.warning("♻️ file_id в альбоме отклонён, загружаем картинки заново: %s", e)
+            for path, file_id in zip(paths, file_ids):
+                if file_id:
+                    file_cache.invalidate(path)
+            file_ids = [None] * len(paths)
+            continue
+        except Exception as e:
+            logger.error("Ошибка отправки альбома: %s", e)
+            return False
+        
+        for path, file_id, message in zip(paths, file_ids, sent):
+            if not file_id and message.photo:
+                file_cache.put(path, message.photo[-1].file_id)
+        return True
+    return False
+
 # ==================== КОМАНДЫ БОТА ====================
 
-@dp.message(Command("start"))
+@router.message(Command("start"))
 async def start_cmd(message: types.Message):
     user_id = message.from_user.id
     chat_type = message.chat.type
     
-    logger.info(f"👋 Пользователь {user_id} запустил бота в {chat_type}.")
-    
-    # ВСЕГДА предлагаем выбрать язык при команде /start
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="🇷🇺 Русский", callback_data="lang_ru"),
-            InlineKeyboardButton(text="🇺🇸 English", callback_data="lang_en")
-        ]
-    ])
+    logger.info("👋 Пользователь %s запустил бота в %s.", user_id, chat_type)
     
+    # ВСЕГДА предлагаем выбрать язык при команде /start.
     # Если язык уже установлен, показываем приветствие на текущем языке
-    current_lang = get_user_language(user_id)
-    welcome_text = TEXTS[current_lang]["welcome"]
-    
-    await message.answer(welcome_text, reply_markup=keyboard)
+    await message.answer(get_text("welcome", user_id), reply_markup=i18n.language_keyboard)
 
-@dp.callback_query(lambda c: c.data.startswith("lang_"))
+@router.callback_query(lambda c: c.data.startswith("lang_"))
 async def set_language_callback(callback: types.CallbackQuery):
     user_id = callback.from_user.id
-    language = callback.data.split("_")[1]  # lang_ru -> ru
+    language = i18n.resolve(callback.data.split("_")[1])  # lang_ru -> ru
     
-    user_languages[user_id] = language
-    logger.info(f"🌍 Пользователь {user_id} установил язык: {language}")
+    storage.set_language(user_id, language)
+    logger.info("🌍 Пользователь %s установил язык: %s", user_id, language)
     
     await callback.answer(get_text("language_set", user_id))
     await callback.message.delete()
@@ -278,57 +315,40 @@ async def set_language_callback(callback: types.CallbackQuery):
     # Приветствуем на выбранном языке
     await callback.message.answer(get_text("start", user_id))
 
-@dp.message(Command("language"))
+@router.message(Command("language"))
 async def language_cmd(message: types.Message):
     user_id = message.from_user.id
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="🇷🇺 Русский", callback_data="lang_ru"),
-            InlineKeyboardButton(text="🇺🇸 English", callback_data="lang_en")
-        ]
-    ])
-    
-    await message.answer(get_text("welcome", user_id), reply_markup=keyboard)
+    await message.answer(get_text("welcome", user_id), reply_markup=i18n.language_keyboard)
 
-@dp.message(Command("tarot"))
+@router.message(Command("tarot"))
 async def tarot_cmd(message: types.Message):
     user_id = message.from_user.id
     username = message.from_user.username or message.from_user.first_name
     chat_type = message.chat.type
     
-    logger.info(f"🔮 Пользователь {user_id} запросил расклад в {chat_type}.")
+    if not debouncer.allow_tarot(message.chat.id, user_id):
+        logger.info("⏳ Пользователь %s повторил /tarot слишком быстро, пропускаем", user_id)
+        return
+    
+    logger.info("🔮 Пользователь %s запросил расклад в %s.", user_id, chat_type)
     
     # Проверяем есть ли предсказания
-    if not PREDICTIONS:
+    if not catalog.predictions:
         await message.answer(get_text("no_predictions", user_id))
         return
     
-    # Получаем карты, для которых ЕСТЬ предсказания
-    available_cards = get_available_cards()
-    
-    if not available_cards:
+    # Карты, для которых ЕСТЬ предсказания, уже собраны в каталоге
+    if not catalog.cards:
         await message.answer(get_text("no_cards_files", user_id))
         return
     
-    backs = get_images_from_folder(BACKS_DIR)
-    if not backs:
+    back_image = catalog.random_back()
+    if back_image is None:
         await message.answer(get_text("cards_unavailable", user_id))
         return
     
-    back_image = random.choice(backs)
-    logger.info(f"📁 Используется рубашка: {back_image.name}")
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="1", callback_data="card_1"),
-            InlineKeyboardButton(text="2", callback_data="card_2"),
-        ],
-        [
-            InlineKeyboardButton(text="3", callback_data="card_3"),
-            InlineKeyboardButton(text="4", callback_data="card_4"),
-        ]
-    ])
+    logger.info("📁 Используется рубашка: %s", back_image.name)
     
     if chat_type == "private":
         caption = get_text("choose_card", user_id)
@@ -339,42 +359,70 @@ async def tarot_cmd(message: types.Message):
         chat_id=message.chat.id,
         photo_path=back_image,
         caption=caption,
-        reply_markup=keyboard
+        reply_markup=CARD_KEYBOARD
     )
     
     if not success:
         await message.answer(get_text("error_loading", user_id))
 
-@dp.callback_query(lambda c: c.data.startswith("card_"))
-async def process_card_selection(callback: types.CallbackQuery):
-    user_id = callback.from_user.id
-    username = callback.from_user.username or callback.from_user.first_name
-    card_number = callback.data
-    chat_id = callback.message.chat.id
-    chat_type = callback.message.chat.type
-    
-    logger.info(f"🃏 Пользователь {user_id} выбрал карту {card_number} в чате {chat_id}")
-    
+async def remove_card_buttons(callback):
     # Удаляем сообщение с кнопками только в личных чатах
-    if chat_type == "private":
+    if callback.message.chat.type == "private":
         try:
             await callback.message.delete()
         except Exception as e:
-            logger.warning(f"Не удалось удалить сообщение: {e}")
+            logger.warning("Не удалось удалить сообщение: %s", e)
     else:
         # В группах просто убираем кнопки чтобы избежать путаницы
         try:
             await callback.message.edit_reply_markup(reply_markup=None)
         except Exception as e:
-            logger.warning(f"Не удалось убрать кнопки: {e}")
+            logger.warning("Не удалось убрать кнопки: %s", e)
+
+async def reveal_pause(card_path):
+    """Анимация открытия карты; заодно заранее загружаем фото карты"""
+    if config.reveal_delay <= 0:
+        return
+    if card_path is None or not config.service_chat_id:
+        await asyncio.sleep(config.reveal_delay)
+        return
+    await asyncio.gather(
+        asyncio.sleep(config.reveal_delay),
+        ensure_uploaded(bot, config.service_chat_id, assets.resolve(card_path), file_cache)
+    )
+
+@router.callback_query(lambda c: c.data.startswith("card_"))
+async def process_card_selection(callback: types.CallbackQuery):
+    user_id = callback.from_user.id
+    username = callback.from_user.username or callback.from_user.first_name
+    card_number = callback.data
+    chat_id = callback.message.chat.id
+    chat_type = callback.message.chat.type
     
-    await callback.answer(get_text("card_opening", user_id))
-    await asyncio.sleep(1)
+    # Рубашку уже открывает кто-то другой - только отвечаем на нажатие
+    if not debouncer.claim(chat_id, callback.message.message_id):
+        logger.info("🃏 Повторное нажатие %s от %s в чате %s, пропускаем", card_number, user_id, chat_id)
+        await callback.answer(get_text("card_taken", user_id))
+        return
     
-    # Используем ТОЛЬКО карты с предсказаниями
-    available_cards = get_available_cards()
+    logger.info("🃏 Пользователь %s выбрал карту %s в чате %s", user_id, card_number, chat_id)
     
-    if not available_cards:
+    # Карту и предсказание выбираем сразу, чтобы подготовить фото, пока идёт анимация
+    if config.card_of_the_day:
+        selected_card, prediction = get_card_of_the_day(user_id) if catalog.cards else (None, None)
+    else:
+        selected_card = catalog.random_card()
+        if selected_card is not None:
+            prediction = get_unique_prediction_for_card(selected_card, chat_id, user_id)
+    
+    # Убираем кнопки, отвечаем на нажатие и ждём паузу одновременно
+    await asyncio.gather(
+        remove_card_buttons(callback),
+        callback.answer(get_text("card_opening", user_id)).emit(bot),
+        reveal_pause(selected_card)
+    )
+    
+    if selected_card is None:
         error_msg = get_text("cards_unavailable", user_id)
         if chat_type == "private":
             await callback.message.answer(error_msg)
@@ -382,13 +430,7 @@ async def process_card_selection(callback: types.CallbackQuery):
             await callback.message.reply(error_msg)
         return
     
-    # Выбираем случайную карту ИЗ ДОСТУПНЫХ (с предсказаниями)
-    selected_card = random.choice(available_cards)
-    
-    # Получаем предсказание для карты
-    prediction = get_unique_prediction_for_card(selected_card, chat_id, user_id)
-    
-    logger.info(f"📁 Открыта карта: {selected_card.name} в чате {chat_id}")
+    logger.info("📁 Открыта карта: %s в чате %s", selected_card.name, chat_id)
     
     # Формируем текст ответа
     response_text = get_text("your_card", user_id, prediction=prediction)
@@ -412,7 +454,7 @@ async def process_card_selection(callback: types.CallbackQuery):
             )
         
         if success:
-            logger.info(f"📜 Пользователь {user_id} получил предсказание для карты {selected_card.stem}")
+            logger.info("📜 Пользователь %s получил предсказание для карты %s", user_id, selected_card.stem)
         else:
             error_msg = get_text("error_loading", user_id)
             if chat_type == "private":
@@ -421,7 +463,7 @@ async def process_card_selection(callback: types.CallbackQuery):
                 await callback.message.reply(error_msg)
                 
     except Exception as e:
-        logger.error(f"Ошибка отправки предсказания: {e}")
+        logger.error("Ошибка отправки предсказания: %s", e)
         # Если не удалось отправить фото, отправляем текстовое сообщение
         try:
             if chat_type == "private":
@@ -429,137 +471,453 @@ async def process_card_selection(callback: types.CallbackQuery):
             else:
                 await callback.message.reply(response_text)
         except Exception as e2:
-            logger.error(f"Не удалось отправить даже текст: {e2}")
-
-@dp.message(Command("help"))
-async def help_cmd(message: types.Message):
-    user_id = message.from_user.id
-    await message.answer(get_text("help", user_id))
+            logger.error("Не удалось отправить даже текст: %s", e2)
 
-@dp.message(Command("stats"))
-async def stats_cmd(message: types.Message):
+@router.message(Command(*SPREADS))
+async def spread_cmd(message: types.Message, command: CommandObject):
+    """Расклад из нескольких разных карт одним альбомом"""
     user_id = message.from_user.id
+    chat_id = message.chat.id
+    spread = SPREADS[command.command.lower()]
     
-    backs_count = len(get_images_from_folder(BACKS_DIR))
-    all_cards_count = len(get_images_from_folder(OPEN_DIR))
-    available_cards_count = len(get_available_cards())
-    
-    predictions_count = sum(len(preds) for preds in PREDICTIONS.values()) if PREDICTIONS else 0
+    logger.info("🔮 Пользователь %s запросил расклад %s в %s.", user_id, spread.name, message.chat.type)
     
-    active_chats = len(prediction_history)
-    total_cached_predictions = sum(len(chats) for chats in prediction_history.values())
+    if not catalog.cards:
+        await message.answer(get_text("no_cards_files", user_id))
+        return
     
-    stats_text = get_text("stats", user_id,
-                         backs_count=backs_count,
-                         all_cards_count=all_cards_count,
-                         available_cards_count=available_cards_count,
-                         predictions_count=predictions_count,
-                         active_chats=active_chats,
-                         total_cached_predictions=total_cached_predictions)
+    cards = catalog.random_cards(len(spread))
+    if not cards:
+        await message.answer(get_text("spread_not_enough_cards", user_id,
+                                      needed=len(spread), available=len(catalog.cards)))
+        return
     
-    await message.answer(stats_text)
+    # Каждая карта проходит через ту же выборку без повторов, что и /tarot
+    photos = []
+    for position, card in zip(spread.positions, cards):
+        prediction = get_unique_prediction_for_card(card, chat_id, user_id)
+        photos.append((card, get_text("spread_card", user_id, position=get_text(position, user_id), prediction=prediction)))
+    # Заголовок расклада - в подписи первой карты, отдельное сообщение не нужно
+    first_card, first_caption = photos[0]
+    photos[0] = (first_card, f"{get_text(spread.title_key, user_id)}\n\n{first_caption}")
+    
+    success = await send_media_group_safe(
+        chat_id,
+        photos,
+        reply_to_message_id=message.message_id if message.chat.type != "private" else None
+    )
+    if not success:
+        await message.answer(get_text("error_loading", user_id))
 
-@dp.message(Command("cards"))
-async def cards_cmd(message: types.Message):
-    user_id = message.from_user.id
-    
-    if not PREDICTIONS:
-        await message.answer(get_text("no_predictions_loaded", user_id))
+# ==================== INLINE-РЕЖИМ ====================
+def inline_pool_key():
+    # Словарь вариантов картинок подменяется целиком при перезагрузке индекса
+    return (catalog.version, file_cache.version, id(assets.variants))
+
+def refresh_inline_pool():
+    """Пересобираем готовые inline-ответы, если изменилась колода или появились новые file_id.
+
+    Всё берётся из памяти: file_id - через FileIdCache.peek, без stat и хэша файлов.
+    """
+    key = inline_pool_key()
+    if key == inline_pool.key:
         return
-    
-    # Получаем доступные карты (файлы которые есть в папке)
-    available_cards = get_available_cards()
-    available_card_names = [card.stem.lower() for card in available_cards]
+    file_ids = [(card, file_cache.peek(assets.resolve(card))) for card in catalog.cards]
+    entries = {}
+    for lang in i18n.languages:
+        entries[lang] = [
+            (file_id, [
+                i18n.text(lang, "your_card", prediction=prediction)
+                for prediction in catalog.predictions.lookup(card.stem.lower(), lang)[1]
+            ])
+            for card, file_id in file_ids
+            if file_id
+        ]
+    inline_pool.rebuild(key, entries)
+    logger.info("🔎 Inline-пул пересобран: %s ответов", len(inline_pool))
+
+async def _refresh_inline_pool():
+    refresh_inline_pool()
+
+def schedule_inline_refresh():
+    """Пересборка отдельной задачей после ответа, а не внутри inline-запроса.
+
+    Несколько запросов подряд делят одну задачу; в поток не уносим -
+    словари кэша и каталога меняются в цикле событий.
+    """
+    global inline_refresh
+    if inline_refresh is None or inline_refresh.done():
+        inline_refresh = asyncio.create_task(_refresh_inline_pool())
+
+@router.inline_query()
+async def inline_tarot(inline_query: types.InlineQuery):
+    """@bot tarot - карты с предсказаниями прямо в любом чате"""
+    # Отвечаем текущим пулом; если колода или file_id изменились, пул догонит к следующему запросу
+    if inline_pool_key() != inline_pool.key:
+        schedule_inline_refresh()
+    results = inline_pool.pick(get_user_language(inline_query.from_user.id))
+    # Пока ни одна карта не загружена, пустой ответ не кэшируем надолго
+    await inline_query.answer(
+        results,
+        cache_time=config.inline_cache_time if results else 10,
+        is_personal=True
+    )
+
+@router.message(Command("help"))
+async def help_cmd(message: types.Message):
+    user_id = message.from_user.id
+    await message.answer(get_text("help", user_id))
+
+def render_deck_stats(lang):
+    return i18n.text(lang, "stats",
+                     backs_count=len(catalog.backs),
+                     all_cards_count=len(catalog.all_cards),
+                     available_cards_count=len(catalog.cards),
+                     predictions_count=catalog.predictions_total,
+                     reloads=catalog.reloads,
+                     reload_ms=round(catalog.last_reload_seconds * 1000, 1))
+
+def render_cards_list(lang):
+    # Доступные карты (файлы которые есть в папке)
+    available_card_names = catalog.card_names
     
     cards_list = []
-    for card_name, predictions in PREDICTIONS.items():
+    for card_name in catalog.predictions.cards:
         status = "✅" if card_name in available_card_names else "❌"
+        # Количество предсказаний для карты посчитано при сборке каталога
+        pred_count = sum(catalog.prediction_counts[card_name].values())
+        cards_list.append(i18n.text(lang, "cards_list_item", status=status, card=card_name, count=pred_count))
+    
+    return i18n.text(lang, "cards_list", cards_list="\n".join(cards_list))
 
-@dp.message(Command("stats"))
+@router.message(Command("stats"))
 async def stats_cmd(message: types.Message):
-    user_id = message.from_user.id
-    
-    backs_count = len(get_images_from_folder(BACKS_DIR))
-    all_cards_count = len(get_images_from_folder(OPEN_DIR))
-    available_cards_count = len(get_available_cards())
-    
-    predictions_count = sum(len(preds) for preds in PREDICTIONS.values()) if PREDICTIONS else 0
-    
-    active_chats = len(prediction_history)
-    total_cached_predictions = sum(len(chats) for chats in prediction_history.values())
-    
-    stats_text = get_text("stats", user_id,
-                         backs_count=backs_count,
-                         all_cards_count=all_cards_count,
-                         available_cards_count=available_cards_count,
-                         predictions_count=predictions_count,
-                         active_chats=active_chats,
-                         total_cached_predictions=total_cached_predictions)
-    
-    await message.answer(stats_text)
+    """Колода рендерится один раз на версию каталога, остальное - готовые счётчики, O(1)"""
+    lang = i18n.resolve(get_user_language(message.from_user.id))
+    deck_text = stats_cache.get(catalog.version, lang, render_deck_stats)
+    
+    runtime_text = i18n.text(lang, "stats_runtime",
+                             active_chats=sampler.active_chats,
+                             total_cached_predictions=len(sampler),
+                             updates=update_stats.updates,
+                             updates_per_second=round(update_stats.rate(), 1),
+                             p50_ms=round(update_stats.quantile(0.5) * 1000, 1),
+                             p99_ms=round(update_stats.quantile(0.99) * 1000, 1),
+                             uptime_minutes=round(update_stats.uptime / 60),
+                             memory_mb=round(process_rss_bytes() / 2 ** 20, 1),
+                             history_kb=round(sampler.memory_bytes() / 1024),
+                             languages_kb=round(storage.languages.memory_bytes() / 1024),
+                             chat_evictions=sampler.evictions,
+                             language_evictions=storage.languages.evictions)
+    
+    await message.answer(f"{deck_text}\n{runtime_text}")
 
-@dp.message(Command("cards"))
+@router.message(Command("cards"))
 async def cards_cmd(message: types.Message):
     user_id = message.from_user.id
     
-    if not PREDICTIONS:
+    if not catalog.predictions:
         await message.answer(get_text("no_predictions_loaded", user_id))
         return
     
-    # Получаем доступные карты (файлы которые есть в папке)
-    available_cards = get_available_cards()
-    available_card_names = [card.stem.lower() for card in available_cards]
-    
-    cards_list = []
-    for card_name, predictions in PREDICTIONS.items():
-        status = "✅" if card_name in available_card_names else "❌"
-        
-        # Подсчитываем количество предсказаний для карты
-        if isinstance(predictions, dict):
-            # Новая структура
-            pred_count = sum(len(lang_preds) for lang_preds in predictions.values())
-        else:
-            # Старая структура
-            pred_count = len(predictions)
-            
-        cards_list.append(f"{status} {card_name} ({pred_count} предсказаний)")
-    
-    cards_text = "\n".join(cards_list)
-    await message.answer(get_text("cards_list", user_id, cards_list=cards_text))
+    lang = i18n.resolve(get_user_language(user_id))
+    await message.answer(cards_cache.get(catalog.version, lang, render_cards_list))
+
+# ==================== СБОРКА ПРИЛОЖЕНИЯ ====================
+def setup_logging():
+    """Логи через очередь и отдельный поток, см. logs.py"""
+    return setup_queue_logging()
+
+def create_app(app_config=None):
+    """Собирает Bot и Dispatcher. Дёшево: колода, локализация, хранилище и
+    кэш file_id загружаются при старте диспетчера (load_resources).
+
+    Роутер с обработчиками один на процесс, поэтому create_app вызывается
+    один раз.
+    """
+    global config, bot, dp, send_scheduler, metrics, send_photo_safe, inline_pool, debouncer, update_stats, update_drain
+    started = time.perf_counter()
+    if app_config is None:
+        load_dotenv()
+        app_config = Config()
+    config = app_config
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(config.telegram_api_url)) if config.telegram_api_url else None
+    bot = Bot(token=config.token, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+
+    # Лимиты Telegram действуют на бота целиком, поэтому в режиме
+    # нескольких воркеров общий лимит делится между ними
+    send_scheduler = None
+    if config.send_scheduler:
+        send_scheduler = SendScheduler(
+            global_rate=config.global_rate_limit / config.worker_count,
+            group_rate=config.group_rate_limit,
+            unlimited_chats=[config.service_chat_id],
+        )
+        bot.session.middleware(send_scheduler)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    # При остановке новые апдейты не принимаются, начатые доигрывают
+    update_drain = UpdateDrain()
+    dp.update.outer_middleware(update_drain)
+    # Счётчики апдейтов и задержек для /stats работают и без /metrics
+    update_stats = UpdateStats()
+    dp.update.outer_middleware(update_stats)
+    # id апдейта в каждой строке лога, пока он обрабатывается
+    dp.update.outer_middleware(CorrelationMiddleware())
+    inline_pool = InlinePool(config.inline_results)
+    debouncer = PressDebouncer(config.tarot_cooldown)
+
+    # Без METRICS_PORT middleware не регистрируются и ничего не стоят
+    metrics = None
+    send_photo_safe = _send_photo_safe
+    if config.metrics_port:
+        metrics = Metrics()
+        setup_metrics()
+
+    startup_timings["app"] = time.perf_counter() - started
+    return dp, bot
+
+def setup_metrics():
+    global send_photo_safe
+    # После планировщика: меряем сам вызов API, без ожидания в очереди
+    bot.session.middleware(ApiMetricsMiddleware(metrics))
+    handler_metrics = HandlerMetricsMiddleware(metrics)
+    dp.message.middleware(handler_metrics)
+    dp.callback_query.middleware(handler_metrics)
+    dp.inline_query.middleware(handler_metrics)
+    send_photo_safe = instrument_send_photo(metrics, _send_photo_safe, lambda path: assets.resolve(path) in file_cache)
+
+    # Лямбды читают глобальные имена в момент запроса /metrics, когда ресурсы уже загружены
+    metrics.gauge("tarot_startup_seconds", "Длительность холодного старта", lambda: startup_timings.get("total", 0.0))
+    metrics.counter("tarot_file_id_cache_hits_total", "Отправки фото по file_id", lambda: file_cache.hits)
+    metrics.counter("tarot_file_id_cache_misses_total", "Отправки фото без file_id", lambda: file_cache.misses)
+    metrics.gauge("tarot_file_id_cache_size", "Картинок в кэше file_id", lambda: len(file_cache))
+    metrics.counter("tarot_log_lines_sampled_out_total", "Строк лога, отброшенных прореживанием",
+                  lambda: sampling_filter().suppressed if sampling_filter() else 0)
+    metrics.gauge("tarot_updates_in_flight", "Апдейтов в обработке", lambda: update_drain.active)
+    metrics.counter("tarot_updates_total", "Обработано апдейтов с запуска", lambda: update_stats.updates)
+    metrics.counter("tarot_duplicate_presses_total", "Погашено повторных нажатий на рубашку", lambda: debouncer.duplicate_presses)
+    metrics.counter("tarot_cooldown_hits_total", "Пропущено /tarot из-за паузы между раскладами", lambda: debouncer.cooldown_hits)
+    metrics.gauge("tarot_history_entries", "Записей в истории предсказаний", lambda: len(sampler))
+    metrics.gauge("tarot_history_chats", "Чатов с историей предсказаний", lambda: sampler.active_chats)
+    metrics.counter("tarot_history_evictions_total", "Чатов, вытесненных из истории", lambda: sampler.evictions)
+    metrics.gauge("tarot_history_bytes", "Оценка памяти истории", lambda: sampler.memory_bytes())
+    metrics.counter("tarot_history_sweeps_total", "Фоновых чисток истории", lambda: sampler.sweeps)
+    metrics.gauge("tarot_history_sweep_expired", "Истекло записей за последнюю чистку", lambda: sampler.last_sweep_expired)
+    metrics.gauge("tarot_history_sweep_seconds", "Длительность последней чистки", lambda: sampler.last_sweep_seconds)
+    metrics.gauge("tarot_language_cache_size", "Языков в памяти", lambda: len(storage.languages))
+    metrics.counter("tarot_language_cache_evictions_total", "Языков, вытесненных из памяти", lambda: storage.languages.evictions)
+    metrics.gauge("tarot_process_rss_bytes", "Память процесса", process_rss_bytes)
+    metrics.gauge("tarot_deck_cards", "Карт с предсказаниями", lambda: len(catalog.cards))
+    metrics.gauge("tarot_asset_variants", "Картинок с пережатым вариантом", lambda: len(assets.variants))
+    metrics.gauge("tarot_asset_bytes_saved", "Экономия на загрузку всех картинок, байт", lambda: assets.total_bytes_saved)
+    metrics.counter("tarot_deck_reloads_total", "Перезагрузок predictions.json", lambda: catalog.reloads)
+    metrics.counter("tarot_deck_reload_failures_total", "Отклонённых версий predictions.json", lambda: catalog.reload_failures)
+    metrics.gauge("tarot_deck_reload_seconds", "Длительность последней перезагрузки", lambda: catalog.last_reload_seconds)
+    if send_scheduler:
+        metrics.gauge("tarot_send_queue_depth", "Запросов в очереди планировщика", lambda: send_scheduler.queue_depth)
+        metrics.gauge("tarot_send_queue_depth_max", "Максимальная глубина очереди", lambda: send_scheduler.queue_depth_max)
+        metrics.gauge("tarot_send_wait_seconds_max", "Максимальное ожидание в очереди", lambda: send_scheduler.wait_time_max)
+        metrics.counter("tarot_send_retries_total", "Повторов запросов к API", lambda: send_scheduler.retries)
+        metrics.counter("tarot_send_flood_waits_total", "Ответов 429 от Telegram", lambda: send_scheduler.flood_waits)
+
+async def _timed_load(name, factory, *args):
+    started = time.perf_counter()
+    result = await asyncio.to_thread(factory, *args)
+    startup_timings[name] = time.perf_counter() - started
+    return result
+
+async def load_resources():
+    """Кэш file_id, хранилище, локализация и каталог грузятся параллельно в потоках:
+    чтение файлов и открытие SQLite не ждут друг друга и не держат event loop"""
+    global file_cache, storage, i18n, sampler, catalog, assets
+    started = time.perf_counter()
+    BACKS_DIR.mkdir(parents=True, exist_ok=True)
+    OPEN_DIR.mkdir(parents=True, exist_ok=True)
+
+    file_cache, storage, i18n, catalog, assets = await asyncio.gather(
+        _timed_load("file_cache", FileIdCache, config.file_id_cache_file),
+        _timed_load("storage", create_storage, config.storage_kind, config.state_db_file,
+                    CACHE_DURATION, config.language_cache_ttl, config.max_languages),
+        _timed_load("i18n", Localization, LOCALES_DIR, "ru"),
+        _timed_load("catalog", CardCatalog, OPEN_DIR, BACKS_DIR, PREDICTIONS_FILE),
+        _timed_load("assets", AssetIndex, config.asset_index_file),
+    )
+    sampler = PredictionSampler(CACHE_DURATION, storage=storage, max_chats=config.max_history_chats)
+    startup_timings["resources"] = time.perf_counter() - started
+
+def format_startup_timings():
+    parts = [
+        f"{label} {startup_timings[key] * 1000:.0f}"
+        for key, label in (
+            ("app", "сборка"), ("file_cache", "кэш file_id"), ("storage", "хранилище"),
+            ("i18n", "локализация"), ("catalog", "каталог"), ("assets", "варианты картинок"),
+            ("restore", "история"), ("warm_up", "прогрев колоды"),
+        )
+        if key in startup_timings
+    ]
+    return f"{startup_timings.get('total', 0.0) * 1000:.0f} мс ({', '.join(parts)} мс)"
+
+# ==================== СНИМОК СОСТОЯНИЯ ====================
+def save_state_snapshot():
+    """Языки и живая история процесса - в бинарный снимок (см. snapshot.py)"""
+    started = time.perf_counter()
+    languages = [(user_id, language) for user_id, language in storage.languages.items() if language]
+    draws = sampler.snapshot()
+    size = write_snapshot(config.snapshot_file, config.worker_index, config.worker_count, languages, draws)
+    logger.info(
+        "💾 Снимок состояния: языков %s, записей истории %s, %.1f КБ за %.1f мс",
+        len(languages), len(draws), size / 1024, (time.perf_counter() - started) * 1000,
+    )
+
+def load_state_snapshot():
+    """История из снимка с прогревом кэша языков; None - снимка нет или он не подходит"""
+    path = config.snapshot_file
+    if not path.exists():
+        return None
+    try:
+        header, languages, draws = read_snapshot(path)
+    except (OSError, SnapshotError) as e:
+        logger.warning("⚠️ Снимок состояния %s не прочитан: %s", path, e)
+        return None
+    finally:
+        # Снимок одноразовый: если процесс упадёт, не успев записать новый,
+        # при следующем запуске история возьмётся из хранилища
+        path.unlink(missing_ok=True)
+    if header["worker_count"] != config.worker_count:
+        logger.warning("⚠️ Снимок записан при другом числе воркеров, историю берём из хранилища")
+        return None
+    if time.time() - header["written_at"] > CACHE_DURATION:
+        # Вся история в нём уже истекла, а языки могли смениться
+        logger.warning("⚠️ Снимок состояния старше %s с, историю берём из хранилища", CACHE_DURATION)
+        return None
+    storage.warm_languages(languages)
+    return draws
 
 # ==================== ЗАПУСК БОТА ====================
-async def main():
-    logger.info("🤖 Запуск бота Таро...")
+background_tasks = []
+background_runners = []
+
+def deck_paths():
+    """Файлы, которые бот отправляет: рубашки и карты с учётом пережатых вариантов"""
+    return [assets.resolve(path) for path in catalog.backs + catalog.cards]
+
+def is_own_chat(chat_id):
+    """Чаты распределены между воркерами по chat_id (см. webhook.py)"""
+    return chat_id % config.worker_count == config.worker_index
+
+@router.startup()
+async def on_startup():
+    await load_resources()
     
     # Проверяем наличие необходимых файлов
-    if not PREDICTIONS:
+    if not catalog.predictions:
         logger.error("❌ КРИТИЧЕСКАЯ ОШИБКА: Нет загруженных предсказаний!")
     else:
-        logger.info(f"✅ Загружено предсказаний для {len(PREDICTIONS)} карт")
+        logger.info("✅ Загружено предсказаний для %s карт (версия %s)", len(catalog.predictions), catalog.predictions.version)
     
-    backs = get_images_from_folder(BACKS_DIR)
-    if not backs:
+    if not catalog.backs:
         logger.warning("⚠️ В папке images/backs нет изображений рубашек!")
     else:
-        logger.info(f"✅ Найдено рубашек: {len(backs)}")
+        logger.info("✅ Найдено рубашек: %s", len(catalog.backs))
     
-    available_cards = get_available_cards()
-    if not available_cards:
+    if not catalog.cards:
         logger.warning("⚠️ Нет доступных карт с предсказаниями!")
     else:
-        logger.info(f"✅ Доступно карт с предсказаниями: {len(available_cards)}")
+        logger.info("✅ Доступно карт с предсказаниями: %s", len(catalog.cards))
+    
+    logger.info("🗂 В кэше file_id: %s картинок", len(file_cache))
+    if config.warm_up_cache and config.worker_index == 0 and not config.service_chat_id:
+        logger.warning("⚠️ WARM_UP_CACHE включён, но SERVICE_CHAT_ID не задан")
+    
+    # Каждый воркер восстанавливает историю только своих чатов: из снимка,
+    # оставленного при остановке, а если его нет - из хранилища
+    started = time.perf_counter()
+    draws = load_state_snapshot()
+    source = "снимка"
+    if draws is None:
+        draws = storage.load_draws(time.time() - CACHE_DURATION)
+        source = "хранилища"
+    restored = sampler.restore([draw for draw in draws if is_own_chat(draw[0])], prediction_count)
+    startup_timings["restore"] = time.perf_counter() - started
+    if restored:
+        logger.info(
+            "🕒 Восстановлено предсказаний из %s: %s за %.1f мс", source, restored, startup_timings["restore"] * 1000
+        )
+    
+    startup_timings["total"] = startup_timings.get("app", 0.0) + startup_timings["resources"] + startup_timings["restore"]
+    logger.info("⏱ Холодный старт: %s", format_startup_timings())
+    
+    if metrics:
+        # У каждого воркера свой порт: METRICS_PORT, METRICS_PORT + 1, ...
+        background_runners.append(await metrics.start_server(config.metrics_host, int(config.metrics_port) + config.worker_index))
+    
+    background_tasks.append(asyncio.create_task(catalog.watch(config.catalog_poll_interval)))
+    background_tasks.append(asyncio.create_task(assets.watch(config.catalog_poll_interval)))
+    background_tasks.append(asyncio.create_task(storage.run_flusher(config.storage_flush_interval)))
+    # Хэши картинок и запись кэша file_id - в потоках, а не в обработчиках
+    background_tasks.append(asyncio.create_task(file_cache.watch(deck_paths, config.catalog_poll_interval)))
+    background_tasks.append(asyncio.create_task(file_cache.run_flusher(config.storage_flush_interval)))
+    schedule_inline_refresh()
+    background_tasks.append(asyncio.create_task(
+        sampler.run_expiry(config.history_sweep_interval, config.history_sweep_slice)
+    ))
+    if config.warm_up_cache and config.worker_index == 0 and config.service_chat_id:
+        background_tasks.append(asyncio.create_task(run_warm_up()))
+
+async def run_warm_up():
+    """Предзагрузка колоды в фоне: бот уже принимает апдейты, а карту,
+    которую ещё не загрузили, откроет обычная отправка файлом"""
+    started = time.perf_counter()
+    await warm_up(bot, config.service_chat_id, deck_paths(), file_cache)
+    startup_timings["warm_up"] = time.perf_counter() - started
+    logger.info("⏱ Старт с прогревом колоды: %s", format_startup_timings())
+
+@router.shutdown()
+async def on_shutdown():
+    # Новые апдейты не принимаем, начатые расклады и отправки доигрывают до общего срока
+    started = time.perf_counter()
+    deadline = time.monotonic() + config.drain_timeout
+    if not await update_drain.drain(config.drain_timeout):
+        logger.warning("⚠️ За %.0f с не завершились апдейты: %s", config.drain_timeout, update_drain.active)
+    if send_scheduler is not None and not await send_scheduler.drain(max(0.0, deadline - time.monotonic())):
+        logger.warning("⚠️ В очереди отправки остались запросы: %s", send_scheduler.in_flight)
+    logger.info("⏹ Остановка: апдейты и отправки завершены за %.0f мс", (time.perf_counter() - started) * 1000)
+    
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    for runner in background_runners:
+        await runner.cleanup()
+    background_runners.clear()
+    # Снимок берётся из памяти процесса - пишем его до закрытия хранилища,
+    # чтобы ошибка последнего сброса в базу его не потеряла
+    try:
+        save_state_snapshot()
+    finally:
+        storage.close()
+    file_cache.flush()
+
+async def main():
+    logger.info("🤖 Запуск бота Таро...")
+    dp, bot = create_app()
     
     try:
+        # SIGTERM/SIGINT останавливают опрос; начатые апдейты, очередь
+        # отправки и снимок состояния доделывает on_shutdown
         await dp.start_polling(bot)
     except Exception as e:
-        logger.error(f"❌ Ошибка запуска бота: {e}")
+        logger.error("❌ Ошибка запуска бота: %s", e)
     finally:
         await bot.session.close()
 
 if __name__ == "__main__":
+    setup_logging()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("⏹️ Бот остановлен пользователем")
     except Exception as e:
-        logger.error(f"❌ Непредвиденная ошибка: {e}")
\ No newline at end of file
+        logger.error("❌ Непредвиденная ошибка: %s", e)
\ No newline at end of file
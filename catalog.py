@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import time
+from pathlib import Path
+
+from predictions import EMPTY_TABLE, PredictionsError, load_table
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp"}
+
+
+def scan_images(folder_path):
+    """Один проход по папке вместо отдельного glob на каждое расширение"""
+    folder_path = Path(folder_path)
+    if not folder_path.is_dir():
+        return []
+    with os.scandir(folder_path) as entries:
+        images = [
+            folder_path / entry.name for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+        ]
+    return sorted(images)
+
+
+# ==================== КАТАЛОГ КАРТ ====================
+class CardCatalog:
+    """Индекс колоды в памяти: строится один раз и пересобирается только при изменении файлов.
+
+    predictions.json перечитывается в отдельном потоке, проверяется и
+    подменяется целиком; если новый файл плохой, остаётся старая таблица.
+    """
+
+    def __init__(self, open_dir, backs_dir, predictions_file):
+        self.open_dir = Path(open_dir)
+        self.backs_dir = Path(backs_dir)
+        self.predictions_file = Path(predictions_file)
+        self.predictions = EMPTY_TABLE
+
+        self.cards = ()              # карты, для которых есть предсказания
+        self.all_cards = ()          # все картинки из images/open
+        self.backs = ()              # рубашки
+        self.card_names = frozenset()
+        self.missing = ()            # картинки без предсказаний
+        self.prediction_counts = {}  # {карта: {язык: количество}}
+        self.predictions_total = 0
+        self.version = 0
+        self.deck_key = b""          # отпечаток содержимого колоды, см. daily.py
+        self._fingerprint = None
+
+        # Перезагрузки predictions.json
+        self.reloads = 0
+        self.reload_failures = 0
+        self.last_reload_seconds = 0.0
+        self._predictions_stamp = None
+
+        self.all_cards = tuple(scan_images(self.open_dir))
+        self._load_initial_predictions()
+
+    def _current_fingerprint(self):
+        """mtime папок меняется при добавлении, удалении и переименовании файлов"""
+        fingerprint = []
+        for folder in (self.open_dir, self.backs_dir):
+            try:
+                fingerprint.append(folder.stat().st_mtime_ns)
+            except OSError:
+                fingerprint.append(None)
+        return tuple(fingerprint)
+
+    def _predictions_file_stamp(self):
+        try:
+            stat = self.predictions_file.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _image_names(self):
+        return frozenset(card.stem.lower() for card in self.all_cards)
+
+    def _load_initial_predictions(self):
+        self._predictions_stamp = self._predictions_file_stamp()
+        try:
+            table = load_table(self.predictions_file)
+        except PredictionsError as e:
+            logger.error("❌ predictions.json: %s", e)
+            table = EMPTY_TABLE
+        if table:
+            logger.info("✅ Загружены предсказания для карт: %s", ", ".join(table.cards))
+        self.set_predictions(table)
+
+    def rebuild(self):
+        self._fingerprint = self._current_fingerprint()
+
+        all_cards = scan_images(self.open_dir)
+        cards = []
+        missing = []
+        for card in all_cards:
+            if card.stem.lower() in self.predictions:
+                cards.append(card)
+            else:
+                missing.append(card.stem.lower())
+
+        self.all_cards = tuple(all_cards)
+        self.cards = tuple(cards)
+        self.backs = tuple(scan_images(self.backs_dir))
+        self.card_names = frozenset(card.stem.lower() for card in cards)
+        self.missing = tuple(missing)
+        self.prediction_counts = self.predictions.counts
+        self.predictions_total = self.predictions.total
+        self.version += 1
+        # В отличие от version, зависит только от файлов - одинаков на всех воркерах
+        self.deck_key = hashlib.blake2b(
+            "\n".join([self.predictions.version, *(card.name for card in cards)]).encode(),
+            digest_size=32
+        ).digest()
+
+        for card_name in missing:
+            logger.warning("❌ Для карты '%s' нет предсказаний в файле", card_name)
+        # При запуске предсказания без картинки не ошибка - откатываться не на что:
+        # такие карты просто не выпадают и помечены ❌ в /cards. Перезагрузку,
+        # которая добавляет новые карты без картинок, отклоняет reload_predictions
+        without_images = sorted(set(self.predictions.cards) - {card.stem.lower() for card in all_cards})
+        if without_images:
+            logger.warning("⚠️ Нет картинок для карт из predictions.json: %s", ", ".join(without_images))
+        logger.info("🎴 Каталог собран: карт с предсказаниями %s, рубашек %s", len(self.cards), len(self.backs))
+
+    def set_predictions(self, predictions):
+        self.predictions = predictions
+        self.rebuild()
+
+    def refresh_if_changed(self):
+        if self._current_fingerprint() == self._fingerprint:
+            return False
+        logger.info("🔄 Папки с картинками изменились, пересобираем каталог")
+        self.rebuild()
+        return True
+
+    async def reload_predictions(self):
+        """Перечитываем predictions.json вне event loop и атомарно подменяем таблицу"""
+        started = time.perf_counter()
+        try:
+            # Карты без картинок, уже принятые при запуске, перезагрузке не мешают,
+            # а новая карта без картинки - скорее всего опечатка в имени
+            table = await asyncio.to_thread(
+                load_table, self.predictions_file, self._image_names(), frozenset(self.predictions.cards)
+            )
+        except PredictionsError as e:
+            self.reload_failures += 1
+            logger.error("❌ Новый predictions.json отклонён, остаётся версия %s: %s", self.predictions.version, e)
+            return False
+        self.set_predictions(table)
+        self.reloads += 1
+        self.last_reload_seconds = time.perf_counter() - started
+        logger.info(
+            "✅ predictions.json перезагружен: версия %s, карт %s, %.1f мс",
+            table.version, len(table), self.last_reload_seconds * 1000,
+        )
+        return True
+
+    async def watch(self, interval):
+        """Фоновый опрос mtime папок и predictions.json"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.refresh_if_changed()
+                stamp = self._predictions_file_stamp()
+                if stamp != self._predictions_stamp:
+                    self._predictions_stamp = stamp
+                    await self.reload_predictions()
+            except Exception as e:
+                logger.error("Ошибка обновления каталога карт: %s", e)
+
+    def random_card(self):
+        return random.choice(self.cards) if self.cards else None
+
+    def random_cards(self, count):
+        """count разных карт для расклада"""
+        return random.sample(self.cards, count) if len(self.cards) >= count else []
+
+    def random_back(self):
+        return random.choice(self.backs) if self.backs else None
@@ -0,0 +1,20 @@
+import datetime
+import hashlib
+
+
+# ==================== КАРТА ДНЯ ====================
+# Карта и предсказание выводятся из хэша (пользователь, дата, колода), а не
+# из истории: ответ один и тот же весь день, хранить ничего не нужно, и любой
+# воркер считает его одинаково. blake2b с ключом-отпечатком колоды: новая
+# колода или новый predictions.json дают новый расклад.
+
+def current_day(utc_offset_hours=0):
+    """Дата, по которой меняется карта дня"""
+    zone = datetime.timezone(datetime.timedelta(hours=utc_offset_hours))
+    return datetime.datetime.now(zone).date()
+
+
+def daily_seeds(user_id, day, deck_key):
+    """Два независимых 64-битных числа: для выбора карты и для выбора предсказания"""
+    digest = hashlib.blake2b(f"{user_id}:{day.isoformat()}".encode(), digest_size=16, key=deck_key).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
@@ -0,0 +1,54 @@
+import time
+
+from lru import LRUCache
+
+# Сколько помнить уже открытые рубашки: дольше кнопки под ними не живут
+CLAIM_TTL = 3600
+# Сколько ключей держать в памяти; самые давние вытесняются
+MAX_ENTRIES = 100000
+
+
+# ==================== ПОВТОРНЫЕ НАЖАТИЯ ====================
+class PressDebouncer:
+    """Гасит повторные нажатия на одну рубашку и частые /tarot.
+
+    Первое нажатие на кнопку под рубашкой забирает расклад этого
+    сообщения; остальные получают только мгновенный answerCallbackQuery,
+    без удаления сообщения, паузы и отправки фото. /tarot одного
+    пользователя в одном чате проходит не чаще раза в tarot_cooldown
+    секунд.
+
+    Все ключи начинаются с chat_id: в режиме нескольких воркеров апдейты
+    чата всегда попадают в один процесс (см. webhook.py), поэтому общего
+    состояния между процессами не нужно.
+    """
+    __slots__ = ("tarot_cooldown", "_claims", "_cooldowns", "duplicate_presses", "cooldown_hits")
+
+    def __init__(self, tarot_cooldown=0, clock=time.monotonic):
+        self.tarot_cooldown = tarot_cooldown
+        self._claims = LRUCache(MAX_ENTRIES, CLAIM_TTL, clock)                # {(чат, сообщение): True}
+        self._cooldowns = LRUCache(MAX_ENTRIES, tarot_cooldown or None, clock)  # {(чат, пользователь): True}
+        self.duplicate_presses = 0   # погашено повторных нажатий
+        self.cooldown_hits = 0       # пропущено /tarot из-за паузы
+
+    def claim(self, chat_id, message_id):
+        """True - нажатие первое и расклад за ним; False - сообщение уже открывают"""
+        key = (chat_id, message_id)
+        if key in self._claims:
+            self.duplicate_presses += 1
+            return False
+        self._claims.set(key, True)
+        return True
+
+    def allow_tarot(self, chat_id, user_id):
+        if self.tarot_cooldown <= 0:
+            return True
+        key = (chat_id, user_id)
+        if key in self._cooldowns:
+            self.cooldown_hits += 1
+            return False
+        self._cooldowns.set(key, True)
+        return True
+
+    def __len__(self):
+        return len(self._claims) + len(self._cooldowns)
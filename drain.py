@@ -0,0 +1,44 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== ОСТАНОВКА БЕЗ ПОТЕРЬ ====================
+class UpdateDrain:
+    """Внешний middleware диспетчера: апдейты в обработке и приём новых.
+
+    При остановке drain() перестаёт пускать новые апдейты и ждёт, пока
+    доиграют начатые - например, расклад посреди паузы "карта
+    открывается" - но не дольше timeout.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.accepting = True
+        self.rejected = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(self, handler, event, data):
+        if not self.accepting:
+            self.rejected += 1
+            logger.info("⏹ Апдейт %s пришёл во время остановки, пропускаем", event.update_id)
+            return None
+        self.active += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.active -= 1
+            if not self.active:
+                self._idle.set()
+
+    async def drain(self, timeout):
+        """True - все апдейты доработали; False - кто-то не успел за timeout"""
+        self.accepting = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
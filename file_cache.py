@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from aiogram.types import FSInputFile
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== КЭШ FILE_ID ====================
+class FileIdCache:
+    """Постоянный кэш file_id Telegram для картинок.
+
+    Ключ — путь к файлу плюс хэш его содержимого, поэтому заменённая
+    картинка с тем же именем будет загружена заново.
+
+    Обработчики работают только с памятью: хэши файлов пересчитывает
+    watch() в отдельном потоке, а на диск кэш записывает run_flusher().
+    Заменённую картинку бот шлёт по старому file_id, пока watch() её
+    не заметит.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = Path(cache_file)
+        self._ids = {}       # {"путь#sha256": file_id}
+        self._hashes = {}    # {"путь": sha256} - текущее содержимое файлов
+        self._unhashed = {}  # {"путь": file_id} - загрузки, для которых хэш ещё не посчитан
+        self._digests = {}   # {путь: (mtime_ns, size, sha256)} - кэш потока хэширования
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.uploads = 0
+        self.version = 0     # растёт при каждом изменении - по нему пересобирают производные данные
+        self.uploading = {}  # {путь: задача загрузки в служебный чат}
+        self._load()
+
+    def _load(self):
+        """Читаем кэш и хэшируем упомянутые в нём картинки - при создании, в потоке загрузки"""
+        if not self.cache_file.exists():
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                self._ids = json.load(f)
+            logger.info("✅ Загружено file_id из кэша: %s", len(self._ids))
+        except Exception as e:
+            logger.error("Ошибка загрузки кэша file_id: %s", e)
+            self._ids = {}
+        self._hashes = self._hash_files({key.rpartition("#")[0] for key in self._ids})
+
+    def _write(self, ids):
+        """Атомарно записываем кэш на диск"""
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # Кэш может писать несколько воркеров - у каждого свой временный файл
+        tmp_file = self.cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(ids, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_file, self.cache_file)
+
+    def _digest(self, path):
+        """Хэш содержимого; пересчитываем только если файл изменился"""
+        stat = path.stat()
+        cached = self._digests.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def _hash_files(self, paths):
+        """{"путь": sha256} существующих файлов; вызывается вне event loop"""
+        hashes = {}
+        for path in paths:
+            path = Path(path)
+            try:
+                hashes[path.as_posix()] = self._digest(path)
+            except OSError:
+                continue
+        return hashes
+
+    def _apply_hashes(self, hashes):
+        """Принимаем хэши, посчитанные в потоке; вызывается в event loop"""
+        changed = False
+        for name, sha in hashes.items():
+            if self._hashes.get(name) != sha:
+                self._hashes[name] = sha
+                changed = True
+            file_id = self._unhashed.pop(name, None)
+            if file_id is not None:
+                self._ids[f"{name}#{sha}"] = file_id
+                self._dirty = True
+        if changed:
+            self.version += 1
+
+    def _lookup(self, path):
+        name = Path(path).as_posix()
+        sha = self._hashes.get(name)
+        if sha is None:
+            return self._unhashed.get(name)
+        return self._ids.get(f"{name}#{sha}")
+
+    def get(self, path):
+        file_id = self._lookup(path)
+        if file_id:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return file_id
+
+    def peek(self, path):
+        """Как get, но без учёта в статистике попаданий"""
+        return self._lookup(path)
+
+    def put(self, path, file_id):
+        name = Path(path).as_posix()
+        sha = self._hashes.get(name)
+        if sha is None:
+            # Новая картинка: в файл кэша попадёт, когда run_flusher посчитает её хэш
+            self._unhashed[name] = file_id
+        else:
+            self._ids[f"{name}#{sha}"] = file_id
+            self._dirty = True
+        self.uploads += 1
+        self.version += 1
+
+    def invalidate(self, path):
+        name = Path(path).as_posix()
+        sha = self._hashes.get(name)
+        if sha is None:
+            file_id = self._unhashed.pop(name, None)
+        else:
+            file_id = self._ids.pop(f"{name}#{sha}", None)
+        if file_id is not None:
+            self._dirty = self._dirty or sha is not None
+            self.version += 1
+
+    def flush(self):
+        """Синхронная запись при остановке"""
+        if self._unhashed:
+            self._apply_hashes(self._hash_files(list(self._unhashed)))
+        if self._dirty:
+            self._dirty = False
+            self._write(dict(self._ids))
+
+    async def run_flusher(self, interval):
+        """Фоновая запись кэша на диск вместе с хэшами только что загруженных картинок"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self._unhashed:
+                    self._apply_hashes(await asyncio.to_thread(self._hash_files, list(self._unhashed)))
+                if self._dirty:
+                    self._dirty = False
+                    await asyncio.to_thread(self._write, dict(self._ids))
+            except Exception as e:
+                self._dirty = True
+                logger.error("Ошибка сохранения кэша file_id: %s", e)
+
+    async def watch(self, paths, interval):
+        """Фоновая проверка картинок: paths() - файлы, которые бот сейчас отправляет"""
+        while True:
+            try:
+                self._apply_hashes(await asyncio.to_thread(self._hash_files, paths()))
+            except Exception as e:
+                logger.error("Ошибка проверки картинок для кэша file_id: %s", e)
+            await asyncio.sleep(interval)
+
+    def __contains__(self, path):
+        return self._lookup(path) is not None
+
+    def __len__(self):
+        return len(self._ids) + len(self._unhashed)
+
+
+def is_file_id_rejected(error):
+    """Telegram не принял file_id (устарел, чужой бот и т.п.)"""
+    text = str(error).lower()
+    return "file" in text and ("identifier" in text or "reference" in text or "not found" in text)
+
+
+async def ensure_uploaded(bot, chat_id, path, cache):
+    """Загружаем картинку в служебный чат, если её file_id ещё не известен.
+
+    Одновременные вызовы для одного пути ждут одну загрузку; True
+    возвращается только тому, кто её начал.
+    """
+    if path in cache:
+        return False
+    task = cache.uploading.get(path)
+    if task is not None:
+        # shield: отмена одного ждущего не должна обрывать общую загрузку
+        await asyncio.shield(task)
+        return False
+    task = asyncio.ensure_future(_upload(bot, chat_id, path, cache))
+    cache.uploading[path] = task
+    task.add_done_callback(lambda _: cache.uploading.pop(path, None))
+    return await asyncio.shield(task)
+
+
+async def _upload(bot, chat_id, path, cache):
+    try:
+        message = await bot.send_photo(
+            chat_id=chat_id,
+            photo=FSInputFile(path),
+            disable_notification=True
+        )
+        cache.put(path, message.photo[-1].file_id)
+        try:
+            await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+        except Exception as e:
+            logger.warning("Не удалось удалить служебное сообщение: %s", e)
+        return True
+    except Exception as e:
+        logger.error("Ошибка предзагрузки %s: %s", path, e)
+        return False
+
+
+async def warm_up(bot, chat_id, paths, cache):
+    """Заранее загружаем картинки в служебный чат и запоминаем file_id"""
+    uploaded = 0
+    for path in paths:
+        if await ensure_uploaded(bot, chat_id, path, cache):
+            uploaded += 1
+
+    logger.info("🔥 Предзагрузка колоды: загружено %s, всего в кэше %s", uploaded, len(cache))
+    return uploaded
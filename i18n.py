@@ -0,0 +1,124 @@
+import json
+import logging
+import string
+from pathlib import Path
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+_formatter = string.Formatter()
+
+
+class Template:
+    """Шаблон сообщения, разобранный один раз при загрузке.
+
+    Поля вида {name} подставляются простой склейкой кусков; шаблоны с
+    форматированием ({count:>3}, {name!r}) рендерятся обычным str.format.
+    """
+    __slots__ = ("text", "parts", "simple")
+
+    def __init__(self, text):
+        self.text = text
+        self.parts = []  # [(литерал, имя поля или None)]
+        self.simple = True
+        for literal, field, spec, conversion in _formatter.parse(text):
+            if spec or conversion or (field is not None and not field.isidentifier()):
+                self.simple = False
+            self.parts.append((literal, field))
+
+    def render(self, kwargs):
+        if not self.simple:
+            return self.text.format(**kwargs)
+        return "".join(
+            literal + (str(kwargs[field]) if field is not None else "")
+            for literal, field in self.parts
+        )
+
+
+# ==================== ЛОКАЛИЗАЦИЯ ====================
+class Localization:
+    """Каталоги сообщений из locales/<язык>.json.
+
+    Новый язык добавляется файлом, без правки кода: в "_meta" лежит
+    название для кнопки выбора языка, остальные ключи - тексты. Все
+    шаблоны разбираются при загрузке, тексты без полей отдаются как есть.
+    """
+
+    def __init__(self, directory, default_language="ru"):
+        self.directory = Path(directory)
+        self.default_language = default_language
+        self.languages = ()   # коды языков, язык по умолчанию первый
+        self.names = {}       # {язык: название для кнопки}
+        self._templates = {}  # {язык: {ключ: Template}}
+        self.language_keyboard = None
+        self.load()
+
+    def load(self):
+        catalogs = {}
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    catalogs[path.stem] = json.load(f)
+            except Exception as e:
+                logger.error("Ошибка загрузки локализации %s: %s", path.name, e)
+
+        if self.default_language not in catalogs:
+            raise ValueError(f"❌ Нет файла локализации для языка по умолчанию: {self.default_language}")
+
+        default_texts = {key: text for key, text in catalogs[self.default_language].items() if key != "_meta"}
+        templates, names = {}, {}
+        for lang, catalog in catalogs.items():
+            names[lang] = catalog.get("_meta", {}).get("name", lang)
+            # Недостающие ключи берём из языка по умолчанию
+            texts = dict(default_texts)
+            texts.update((key, text) for key, text in catalog.items() if key != "_meta")
+            templates[lang] = {key: Template(text) for key, text in texts.items()}
+
+        self.languages = tuple([self.default_language] + sorted(lang for lang in catalogs if lang != self.default_language))
+        self.names = names
+        self._templates = templates
+        self.language_keyboard = self._build_language_keyboard()
+        logger.info("🌍 Загружены языки: %s", ", ".join(self.languages))
+
+    def _build_language_keyboard(self):
+        buttons = [
+            InlineKeyboardButton(text=self.names[lang], callback_data=f"lang_{lang}")
+            for lang in self.languages
+        ]
+        return InlineKeyboardMarkup(inline_keyboard=[buttons[i:i + 2] for i in range(0, len(buttons), 2)])
+
+    def resolve(self, language):
+        return language if language in self._templates else self.default_language
+
+    def text(self, language, key, **kwargs):
+        template = self._templates[self.resolve(language)].get(key)
+        if template is None:
+            return key
+        if not kwargs:
+            return template.text
+        return template.render(kwargs)
+
+
+class RenderCache:
+    """Готовые тексты по языкам для ответов, которые зависят только от версии данных.
+
+    get() отдаёт текст из кэша, пока version не изменилась; при новой
+    версии (например, перезагрузка колоды) все языки рендерятся заново.
+    """
+    __slots__ = ("version", "_texts", "renders")
+
+    def __init__(self):
+        self.version = None
+        self._texts = {}  # {язык: текст}
+        self.renders = 0
+
+    def get(self, version, language, render):
+        if version != self.version:
+            self.version = version
+            self._texts = {}
+        text = self._texts.get(language)
+        if text is None:
+            text = self._texts[language] = render(language)
+            self.renders += 1
+        return text
@@ -0,0 +1,45 @@
+import random
+
+from aiogram.types import InlineQueryResultCachedPhoto
+
+
+# ==================== INLINE-РЕЖИМ ====================
+class InlinePool:
+    """Заранее собранные ответы на inline-запросы.
+
+    Для каждого языка держим готовые InlineQueryResultCachedPhoto на все
+    пары (карта, предсказание), у карты которых уже есть file_id. Запрос
+    обслуживается случайной выборкой разных карт из пула: без диска, без
+    хранилища и без выбора без повторов. Пул пересобирается, только когда
+    меняется ключ - версия колоды или кэша file_id.
+    """
+
+    def __init__(self, results_per_query=8):
+        self.results_per_query = results_per_query
+        self.key = None
+        self.rebuilds = 0
+        self._pools = {}  # {язык: [[результаты одной карты], ...]}
+
+    def rebuild(self, key, entries):
+        """entries - {язык: [(file_id карты, [подписи с предсказаниями])]}"""
+        self._pools = {
+            lang: [
+                [
+                    InlineQueryResultCachedPhoto(id=f"{lang}{card}.{number}", photo_file_id=file_id, caption=caption)
+                    for number, caption in enumerate(captions)
+                ]
+                for card, (file_id, captions) in enumerate(cards)
+                if captions
+            ]
+            for lang, cards in entries.items()
+        }
+        self.key = key
+        self.rebuilds += 1
+
+    def pick(self, language):
+        """Несколько разных карт, у каждой - случайное предсказание"""
+        cards = self._pools.get(language, ())
+        return [random.choice(results) for results in random.sample(cards, min(self.results_per_query, len(cards)))]
+
+    def __len__(self):
+        return sum(len(results) for cards in self._pools.values() for results in cards)
@@ -0,0 +1,171 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# id апдейта, который сейчас обрабатывается; попадает в каждую строку лога
+update_id_var = contextvars.ContextVar("update_id", default=None)
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s]%(update_tag)s %(message)s"
+TEXT_DATEFMT = "%H:%M:%S"
+# Больше стольких шаблонов в таблице прореживания - забываем прошлые секунды
+MAX_SAMPLED_TEMPLATES = 1000
+
+_listener = None
+
+
+# ==================== ЛОГИРОВАНИЕ ====================
+class CorrelationMiddleware:
+    """Внешний middleware диспетчера: id апдейта в контексте на время его обработки.
+
+    Не наследует aiogram.BaseMiddleware, чтобы модуль не тянул aiogram:
+    logs.py импортирует и лёгкий фронт webhook.py.
+    """
+
+    async def __call__(self, handler, event, data):
+        token = update_id_var.set(event.update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            update_id_var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Дописывает в запись id апдейта - в потоке, который логирует, пока контекст ещё жив"""
+
+    def filter(self, record):
+        record.update_id = update_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Прореживает шумные строки: не больше rate записей INFO и ниже в секунду на шаблон.
+
+    Записи группируются по шаблону сообщения (record.msg до подстановки
+    аргументов), поэтому строки "пользователь X выбрал карту" считаются
+    одной группой, а разовые строки запуска не страдают. WARNING и выше
+    проходят всегда. Сколько строк отброшено - в suppressed, итог по
+    шаблону пишется первой строкой следующей секунды.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self.suppressed = 0
+        self._windows = {}  # {шаблон: [секунда, пропущено, отброшено]}
+
+    def filter(self, record):
+        if self.rate <= 0 or record.levelno > logging.INFO:
+            return True
+        second = int(record.created)
+        if len(self._windows) > MAX_SAMPLED_TEMPLATES:
+            self._windows = {msg: window for msg, window in self._windows.items() if window[0] == second}
+        window = self._windows.get(record.msg)
+        if window is None or window[0] != second:
+            dropped = window[2] if window is not None else 0
+            self._windows[record.msg] = [second, 1, 0]
+            if dropped:
+                record.sampled_out = dropped
+            return True
+        if window[1] < self.rate:
+            window[1] += 1
+            return True
+        window[2] += 1
+        self.suppressed += 1
+        return False
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке.
+
+    Стандартный prepare() склеивает сообщение прямо в event loop; здесь
+    запись уходит в очередь как есть, а строку собирает поток слушателя.
+    Очередь внутри процесса, поэтому аргументы не нужно сериализовать.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        if getattr(record, "update_id", None) is not None:
+            entry["update_id"] = record.update_id
+        if getattr(record, "sampled_out", None):
+            entry["sampled_out"] = record.sampled_out
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Прежний формат строк, плюс #id апдейта и число отброшенных похожих строк"""
+
+    def format(self, record):
+        update_id = getattr(record, "update_id", None)
+        record.update_tag = f" #{update_id}" if update_id is not None else ""
+        text = super().format(record)
+        sampled_out = getattr(record, "sampled_out", None)
+        if sampled_out:
+            text += f" (+{sampled_out} похожих за прошлую секунду)"
+        return text
+
+
+def setup_logging(env=None, stream=None):
+    """Логи через очередь: в event loop запись только кладётся в очередь,
+    форматирование и запись в поток - в отдельном потоке QueueListener.
+
+    LOG_FORMAT - text (по умолчанию) или json; LOG_SAMPLE_RATE - сколько
+    строк INFO одного шаблона в секунду пропускать, 0 - все.
+    Возвращает запущенный QueueListener (останавливается при выходе).
+    """
+    global _listener
+    env = os.environ if env is None else env
+    if env.get("LOG_FORMAT", "text") == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter(TEXT_FORMAT, datefmt=TEXT_DATEFMT)
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    handler = AsyncQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(int(env.get("LOG_SAMPLE_RATE", "20"))))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(env.get("LOG_LEVEL", "INFO"))
+
+    if _listener is not None:
+        _listener.stop()
+    else:
+        # Слушатель дописывает очередь до конца при выходе
+        atexit.register(lambda: _listener.stop())
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    return _listener
+
+
+def sampling_filter():
+    """SamplingFilter текущей настройки логов, если она есть"""
+    for handler in logging.getLogger().handlers:
+        for log_filter in handler.filters:
+            if isinstance(log_filter, SamplingFilter):
+                return log_filter
+    return None
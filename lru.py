@@ -0,0 +1,71 @@
+import sys
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Словарь с ограничением по числу записей и сроку жизни.
+
+    При переполнении выбрасывается запись, к которой дольше всего не
+    обращались; запись старше ttl секунд считается отсутствующей и
+    удаляется при следующем обращении. max_entries=None и ttl=None
+    снимают соответствующее ограничение.
+    """
+    __slots__ = ("max_entries", "ttl", "clock", "_data", "evictions", "expirations")
+
+    def __init__(self, max_entries=None, ttl=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()  # {ключ: (значение, когда истекает или None)}
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        if entry[1] is not None and entry[1] <= self.clock():
+            del self._data[key]
+            self.expirations += 1
+            return default
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def set(self, key, value):
+        deadline = None if self.ttl is None else self.clock() + self.ttl
+        data = self._data
+        data[key] = (value, deadline)
+        data.move_to_end(key)
+        if self.max_entries is not None:
+            while len(data) > self.max_entries:
+                data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def items(self):
+        """Живые записи от давних к свежим - в этом порядке их и надо вставлять обратно"""
+        now = self.clock()
+        return [
+            (key, value) for key, (value, deadline) in self._data.items()
+            if deadline is None or deadline > now
+        ]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+    def memory_bytes(self):
+        """Приблизительно: сам словарь плюс кортеж и ключ на запись, без обхода записей"""
+        return sys.getsizeof(self._data) + len(self._data) * _ENTRY_BYTES
+
+
+# Кортеж (значение, срок) со ссылкой на float и ключ - int вроде user_id
+_ENTRY_BYTES = sys.getsizeof((None, 0.0)) + sys.getsizeof(0.0) + sys.getsizeof(2 ** 40)
@@ -0,0 +1,304 @@
+import bisect
+import functools
+import logging
+import math
+import os
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import FSInputFile
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Корзины UpdateStats: от 0.1 мс с шагом 10% - квантили с точностью до 10%
+_STATS_BUCKET_MIN = 0.0001
+_STATS_BUCKET_STEP = math.log(1.1)
+_STATS_BUCKETS = 150  # верхняя граница ≈ 0.1 мс * 1.1^150 ≈ 27 мин
+# Скорость апдейтов считается за последние столько секунд
+RATE_WINDOW = 60
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}  # {значения меток: число}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    """Значение снимается функцией в момент запроса /metrics"""
+    metric_type = "gauge"
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.warning("Не удалось снять метрику %s: %s", self.name, e)
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}", f"{self.name} {value}"]
+
+
+class LiveCounter(Gauge):
+    """Счётчик, который ведёт сам объект (попадания в кэш, повторы запросов):
+    только растёт и снимается функцией в момент запроса /metrics"""
+    metric_type = "counter"
+
+    def __init__(self, name, help_text, read):
+        if not name.endswith("_total"):
+            raise ValueError(f"имя счётчика должно кончаться на _total: {name}")
+        super().__init__(name, help_text, read)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # {значения меток: [счётчики корзин..., сумма, количество]}
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+def process_rss_bytes():
+    """Текущий RSS процесса; где нет /proc - пиковый"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ==================== РЕЕСТР МЕТРИК ====================
+class Metrics:
+    """Метрики бота в формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+        self.handler_latency = self.add(Histogram(
+            "tarot_handler_seconds", "Время работы обработчиков", labels=("handler",)))
+        self.handler_errors = self.add(Counter(
+            "tarot_handler_errors_total", "Исключения в обработчиках", labels=("handler",)))
+        self.api_latency = self.add(Histogram(
+            "tarot_api_call_seconds", "Длительность вызовов Bot API", labels=("method",)))
+        self.api_errors = self.add(Counter(
+            "tarot_api_errors_total", "Ошибки вызовов Bot API", labels=("method", "error")))
+        self.upload_bytes = self.add(Counter(
+            "tarot_upload_bytes_total", "Байт картинок, загруженных в Telegram файлом", labels=("method",)))
+        self.photo_sends = self.add(Histogram(
+            "tarot_send_photo_seconds", "Отправка фото через send_photo_safe", labels=("cached", "result")))
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, read):
+        return self.add(Gauge(name, help_text, read))
+
+    def counter(self, name, help_text, read):
+        return self.add(LiveCounter(name, help_text, read))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # ---------- HTTP ----------
+    async def handle(self, request):
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def start_server(self, host, port):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info("📈 Метрики доступны на http://%s:%s/metrics", host, port)
+        return runner
+
+
+class UpdateStats(BaseMiddleware):
+    """Внешний middleware диспетчера: апдейты и время их обработки с запуска процесса.
+
+    Работает и без /metrics - на нём держатся цифры в /stats. На апдейт
+    тратится O(1): задержка попадает в логарифмическую корзину, счётчик -
+    в посекундный слот кольца за последние RATE_WINDOW секунд. Квантили
+    и скорость считаются по корзинам, без хранения отдельных замеров.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.updates = 0
+        self.errors = 0
+        self._latency = [0] * (_STATS_BUCKETS + 1)
+        self._rate_counts = [0] * RATE_WINDOW
+        self._rate_seconds = [0] * RATE_WINDOW  # какой секунде принадлежит слот
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def observe(self, seconds):
+        self.updates += 1
+        if seconds <= _STATS_BUCKET_MIN:
+            bucket = 0
+        else:
+            bucket = min(_STATS_BUCKETS, 1 + int(math.log(seconds / _STATS_BUCKET_MIN) / _STATS_BUCKET_STEP))
+        self._latency[bucket] += 1
+
+        second = int(self.clock())
+        slot = second % RATE_WINDOW
+        if self._rate_seconds[slot] != second:
+            self._rate_seconds[slot] = second
+            self._rate_counts[slot] = 0
+        self._rate_counts[slot] += 1
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попал q-квантиль задержки, секунды"""
+        if not self.updates:
+            return 0.0
+        rank = q * self.updates
+        seen = 0
+        for bucket, count in enumerate(self._latency):
+            seen += count
+            if seen >= rank:
+                return _STATS_BUCKET_MIN * math.exp(bucket * _STATS_BUCKET_STEP)
+        return _STATS_BUCKET_MIN * math.exp(_STATS_BUCKETS * _STATS_BUCKET_STEP)
+
+    def rate(self):
+        """Апдейтов в секунду за последние RATE_WINDOW секунд (или с запуска, если он был позже)"""
+        now = self.clock()
+        second = int(now)
+        recent = sum(
+            count for count, slot_second in zip(self._rate_counts, self._rate_seconds)
+            if second - slot_second < RATE_WINDOW
+        )
+        window = min(RATE_WINDOW, max(now - self.started, 1))
+        return recent / window
+
+    @property
+    def uptime(self):
+        return self.clock() - self.started
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware роутера: время и ошибки каждого обработчика"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.handler_errors.inc(name)
+            raise
+        finally:
+            self.metrics.handler_latency.observe(time.perf_counter() - started, name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: длительность и ошибки вызовов Bot API, объём загрузок"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def _count_uploads(self, api_method, method):
+        for value in method.__dict__.values():
+            # В sendMediaGroup файлы лежат внутри списка InputMedia*
+            items = value if isinstance(value, list) else (value,)
+            for item in items:
+                item = getattr(item, "media", item)
+                if isinstance(item, FSInputFile):
+                    try:
+                        self.metrics.upload_bytes.inc(api_method, amount=os.path.getsize(item.path))
+                    except OSError:
+                        pass
+
+    async def __call__(self, make_request, bot, method):
+        api_method = method.__api_method__
+        self._count_uploads(api_method, method)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.metrics.api_errors.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            self.metrics.api_latency.observe(time.perf_counter() - started, api_method)
+
+
+def instrument_send_photo(metrics, send_photo, is_cached):
+    """Обёртка над send_photo_safe: время отправки с разбивкой по попаданию в кэш file_id.
+
+    is_cached(path) спрашивается при каждой отправке, поэтому кэш может
+    появиться позже обёртки.
+    """
+
+    @functools.wraps(send_photo)
+    async def wrapper(chat_id, photo_path, *args, **kwargs):
+        cached = "yes" if is_cached(photo_path) else "no"
+        started = time.perf_counter()
+        success = await send_photo(chat_id, photo_path, *args, **kwargs)
+        metrics.photo_sends.observe(time.perf_counter() - started, cached, "ok" if success else "error")
+        return success
+
+    return wrapper
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = "ru"
+
+
+class PredictionsError(ValueError):
+    """predictions.json не прошёл проверку"""
+
+
+# ==================== ТАБЛИЦА ПРЕДСКАЗАНИЙ ====================
+class PredictionTable:
+    """Неизменяемая таблица предсказаний: {карта: {язык: (предсказания, ...)}}.
+
+    Новая версия файла собирается в новый объект и подменяет старый
+    целиком, поэтому обработчики никогда не видят таблицу наполовину.
+    """
+    __slots__ = ("cards", "counts", "total", "version")
+
+    def __init__(self, cards, version=""):
+        self.cards = MappingProxyType({
+            card: MappingProxyType({lang: tuple(preds) for lang, preds in languages.items()})
+            for card, languages in cards.items()
+        })
+        self.counts = MappingProxyType({
+            card: MappingProxyType({lang: len(preds) for lang, preds in languages.items()})
+            for card, languages in self.cards.items()
+        })
+        self.total = sum(sum(counts.values()) for counts in self.counts.values())
+        self.version = version
+
+    def lookup(self, card, language):
+        """(язык, предсказания) с откатом на язык по умолчанию"""
+        languages = self.cards.get(card)
+        if not languages:
+            return language, ()
+        if language not in languages:
+            # Если нет предсказаний на языке пользователя, используем русский
+            language = DEFAULT_LANGUAGE
+        return language, languages.get(language, ())
+
+    def count(self, card, language):
+        return self.counts.get(card, {}).get(language, 0)
+
+    def __contains__(self, card):
+        return card in self.cards
+
+    def __len__(self):
+        return len(self.cards)
+
+    def items(self):
+        return self.cards.items()
+
+
+EMPTY_TABLE = PredictionTable({})
+
+
+def validate(data, card_images=None, known_cards=frozenset()):
+    """Проверяет структуру и возвращает нормализованный словарь {карта: {язык: [...]}}.
+
+    Если передан card_images, у каждой новой карты (которой нет в
+    known_cards) должна быть картинка с таким именем.
+    """
+    if not isinstance(data, dict) or not data:
+        raise PredictionsError("файл пустой или это не объект")
+
+    cards = {}
+    for card, card_data in data.items():
+        if isinstance(card_data, list):
+            # Старая структура: ["предсказание1", "предсказание2"]
+            logger.warning("❌ Старая структура предсказаний у карты '%s'! Нужно обновить до мультиязычной", card)
+            card_data = {DEFAULT_LANGUAGE: card_data}
+        if not isinstance(card_data, dict) or not card_data:
+            raise PredictionsError(f"у карты '{card}' нет предсказаний по языкам")
+        if DEFAULT_LANGUAGE not in card_data:
+            # На язык по умолчанию откатываются все остальные
+            raise PredictionsError(f"у карты '{card}' нет предсказаний на языке {DEFAULT_LANGUAGE}")
+        for lang, preds in card_data.items():
+            if not isinstance(preds, list) or not preds:
+                raise PredictionsError(f"пустой список предсказаний: '{card}' ({lang})")
+            if not all(isinstance(pred, str) and pred.strip() for pred in preds):
+                raise PredictionsError(f"пустое или нестроковое предсказание: '{card}' ({lang})")
+        if card.lower() in cards:
+            raise PredictionsError(f"карта '{card}' повторяется (имена карт не различают регистр)")
+        cards[card.lower()] = card_data
+
+    if card_images is not None:
+        missing = sorted(card for card in cards if card not in card_images and card not in known_cards)
+        if missing:
+            raise PredictionsError(f"нет картинок для карт: {', '.join(missing)}")
+    return cards
+
+
+def load_table(path, card_images=None, known_cards=frozenset()):
+    """Читает и проверяет predictions.json; при ошибке бросает PredictionsError"""
+    try:
+        raw = path.read_bytes()
+        data = json.loads(raw)
+    except (OSError, ValueError) as e:
+        raise PredictionsError(f"не удалось прочитать {path}: {e}") from e
+    cards = validate(data, card_images, known_cards)
+    return PredictionTable(cards, version=hashlib.sha1(raw).hexdigest()[:12])
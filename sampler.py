@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import sys
+import time
+from array import array
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Сколько записей истекает между проверками времени в фоновой чистке
+EXPIRY_BATCH = 256
+
+
+class _Bag:
+    """Мешок ещё не выпавших индексов предсказаний для (чат, карта, язык).
+
+    Индексы лежат в array('H') - два байта на предсказание вместо
+    восьмибайтной ссылки на int в списке.
+    """
+    __slots__ = ("free", "size", "used", "generation", "chat_id", "key")
+
+    def __init__(self, size, generation, chat_id=None, key=None):
+        self.free = array("H", range(size))
+        self.size = size
+        self.used = 0
+        self.generation = generation
+        self.chat_id = chat_id
+        self.key = key  # (карта, язык)
+
+
+# Оценки размера для memory_bytes(): мешок средней карты с ключом, запись кучи, чат
+_BAG_BYTES = sys.getsizeof(_Bag(0, 0)) + sys.getsizeof(array("H", range(32))) + sys.getsizeof(("card", "ru")) + 32
+_EXPIRY_ENTRY_BYTES = sys.getsizeof((0.0, 0, None, 0, 0)) + sys.getsizeof(0.0) + sys.getsizeof(2 ** 40) + 8
+_CHAT_BYTES = sys.getsizeof({1: 1}) + sys.getsizeof(-10 ** 12)
+
+
+# ==================== ВЫБОР ПРЕДСКАЗАНИЙ БЕЗ ПОВТОРОВ ====================
+class PredictionSampler:
+    """Выбор предсказаний без повторов в чате.
+
+    Для каждой тройки (чат, карта, язык) хранится мешок свободных индексов:
+    выборка — обмен со случайной позицией и pop за O(1). Когда мешок пуст,
+    он наполняется заново. Выпавшие индексы возвращаются в мешок через
+    ttl секунд — их сроки лежат в куче, поэтому истечение стоит O(log n)
+    на запись, без обхода всех чатов. Истекает история в фоновой задаче
+    run_expiry(), а не при выборе карты: индекс может пробыть занятым
+    чуть дольше ttl, зато чистка не попадает в задержку ответа.
+
+    Чатов в памяти не больше max_chats: при переполнении забывается
+    история чата, который дольше всех не тянул карту.
+    """
+
+    def __init__(self, ttl, storage=None, clock=time.time, max_chats=None):
+        self.ttl = ttl
+        self.storage = storage
+        self.clock = clock
+        self.max_chats = max_chats
+        self._chats = OrderedDict()  # {chat_id: {(карта, язык): _Bag}}, давно не тянувшие - в начале
+        self._expiry = []            # куча (истекает_в, seq, мешок, поколение, индекс)
+        self._bag_count = 0
+        self._total = 0
+        self._seq = itertools.count()
+        self.evictions = 0           # чатов, вытесненных по max_chats
+
+        # Фоновая чистка
+        self.sweeps = 0
+        self.last_sweep_expired = 0
+        self.last_sweep_seconds = 0.0
+        self.last_sweep_slices = 0
+
+    def _new_bag(self, chat_id, key, size):
+        bags = self._chats.get(chat_id)
+        if bags is None:
+            bags = self._chats[chat_id] = {}
+        old = bags.get(key)
+        if old is not None:
+            self._total -= old.used
+            old.generation = None
+        else:
+            self._bag_count += 1
+        bag = bags[key] = _Bag(size, next(self._seq), chat_id, key)
+        return bag
+
+    def _drop_bag(self, bag):
+        bags = self._chats[bag.chat_id]
+        del bags[bag.key]
+        self._bag_count -= 1
+        bag.generation = None
+        if not bags:
+            del self._chats[bag.chat_id]
+
+    def _evict_chats(self):
+        if self.max_chats is None:
+            return
+        while len(self._chats) > self.max_chats:
+            _, bags = self._chats.popitem(last=False)
+            for bag in bags.values():
+                self._total -= bag.used
+                # Записи в куче станут неактуальными и выпадут при истечении
+                bag.generation = None
+            self._bag_count -= len(bags)
+            self.evictions += 1
+
+    def draw(self, chat_id, card, lang, size):
+        """Возвращает индекс предсказания, не выпадавшего в этом чате"""
+        now = self.clock()
+        key = (card, lang)
+        bags = self._chats.get(chat_id)
+        bag = bags.get(key) if bags is not None else None
+        if bag is None or bag.size != size:
+            # Новая тройка или список предсказаний карты изменился
+            if bag is not None and self.storage is not None:
+                self.storage.reset_draws(chat_id, card, lang)
+            bag = self._new_bag(chat_id, key, size)
+        elif not bag.free:
+            # Все предсказания использованы - сбрасываем историю для этой карты
+            self._total -= bag.used
+            bag.free = array("H", range(size))
+            bag.used = 0
+            bag.generation = next(self._seq)
+            if self.storage is not None:
+                self.storage.reset_draws(chat_id, card, lang)
+        self._chats.move_to_end(chat_id)
+
+        free = bag.free
+        position = random.randrange(len(free))
+        free[position], free[-1] = free[-1], free[position]
+        index = free.pop()
+
+        bag.used += 1
+        self._total += 1
+        heapq.heappush(self._expiry, (now + self.ttl, next(self._seq), bag, bag.generation, index))
+        if self.storage is not None:
+            self.storage.add_draw(chat_id, card, lang, index, now)
+        self._evict_chats()
+        return index
+
+    def restore(self, draws, size_of):
+        """Восстанавливаем историю из хранилища после перезапуска.
+
+        draws - записи (chat_id, card, lang, index, timestamp) по возрастанию
+        времени, size_of(card, lang) - текущее число предсказаний карты.
+        """
+        now = self.clock()
+        restored = 0
+        for chat_id, card, lang, index, timestamp in draws:
+            if timestamp + self.ttl <= now:
+                continue
+            size = size_of(card, lang)
+            if not size or index >= size:
+                continue
+            key = (card, lang)
+            bags = self._chats.get(chat_id)
+            bag = bags.get(key) if bags is not None else None
+            if bag is None or bag.size != size:
+                bag = self._new_bag(chat_id, key, size)
+            if index not in bag.free:
+                continue
+            bag.free.remove(index)
+            bag.used += 1
+            self._total += 1
+            self._chats.move_to_end(chat_id)
+            heapq.heappush(self._expiry, (timestamp + self.ttl, next(self._seq), bag, bag.generation, index))
+            restored += 1
+        self._evict_chats()
+        return restored
+
+    def snapshot(self):
+        """Живая история для снимка состояния: записи в формате restore(), по возрастанию времени"""
+        draws = [
+            (bag.chat_id, bag.key[0], bag.key[1], index, deadline - self.ttl)
+            for deadline, _, bag, generation, index in self._expiry
+            if bag.generation == generation
+        ]
+        draws.sort(key=lambda draw: draw[4])
+        return draws
+
+    def expire(self, now=None, limit=None):
+        """Возвращает в мешки индексы, выпавшие больше ttl секунд назад.
+
+        limit ограничивает число разобранных записей кучи за вызов.
+        """
+        if now is None:
+            now = self.clock()
+        expired = 0
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            if limit is not None:
+                if not limit:
+                    break
+                limit -= 1
+            _, _, bag, generation, index = heapq.heappop(expiry)
+            if bag.generation != generation:
+                # Мешок с тех пор сбросили или вытеснили - запись уже неактуальна
+                continue
+            bag.free.append(index)
+            bag.used -= 1
+            self._total -= 1
+            if not bag.used:
+                self._drop_bag(bag)
+            expired += 1
+        return expired
+
+    def has_expired(self, now):
+        return bool(self._expiry) and self._expiry[0][0] <= now
+
+    async def sweep(self, slice_seconds=0.005):
+        """Истечение порциями не дольше slice_seconds с отдачей управления циклу между ними"""
+        started = time.perf_counter()
+        now = self.clock()
+        expired = 0
+        slices = 0
+        while self.has_expired(now):
+            slice_started = time.perf_counter()
+            while self.has_expired(now) and time.perf_counter() - slice_started < slice_seconds:
+                expired += self.expire(now, limit=EXPIRY_BATCH)
+            slices += 1
+            await asyncio.sleep(0)
+        self.sweeps += 1
+        self.last_sweep_expired = expired
+        self.last_sweep_seconds = time.perf_counter() - started
+        self.last_sweep_slices = slices
+        return expired
+
+    async def run_expiry(self, interval, slice_seconds=0.005):
+        """Фоновая чистка устаревшей истории"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                expired = await self.sweep(slice_seconds)
+            except Exception as e:
+                logger.error("Ошибка чистки истории предсказаний: %s", e)
+                continue
+            if expired:
+                logger.info(
+                    "🧹 Чистка истории: истекло %s записей за %.1f мс (%s порций), осталось %s",
+                    expired, self.last_sweep_seconds * 1000, self.last_sweep_slices, self._total,
+                )
+
+    def memory_bytes(self):
+        """Приблизительный объём истории в памяти, без обхода записей"""
+        return (
+            sys.getsizeof(self._chats) + sys.getsizeof(self._expiry)
+            + len(self._chats) * _CHAT_BYTES
+            + self._bag_count * _BAG_BYTES
+            + len(self._expiry) * _EXPIRY_ENTRY_BYTES
+        )
+
+    @property
+    def active_chats(self):
+        return len(self._chats)
+
+    def __len__(self):
+        return self._total
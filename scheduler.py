@@ -0,0 +1,238 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше - раньше
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+# Ответы на нажатия кнопок пользователь ждёт прямо сейчас
+HIGH_PRIORITY_METHODS = {"answerCallbackQuery", "answerInlineQuery"}
+# Служебные вызовы, на которые лимиты сообщений не распространяются
+UNLIMITED_METHODS = {"getUpdates", "getMe", "setWebhook", "deleteWebhook", "getWebhookInfo", "getFile", "close", "logOut"}
+# Методы, которые считаются сообщениями в чат. Правки (edit*) новых сообщений
+# не создают и идут только под общий лимит - иначе снятие кнопок в группе
+# съедает токен у фото, которое отправляется следом
+CHAT_LIMITED_PREFIXES = ("send", "copy", "forward")
+
+
+def is_group_chat(chat_id):
+    """Группы и каналы - отрицательные id и @username; остальное - лички"""
+    if isinstance(chat_id, str):
+        return chat_id.startswith("@") or chat_id.startswith("-")
+    return chat_id < 0
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity впрок"""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.paused_until = 0.0
+
+    def delay(self, now):
+        """Через сколько секунд появится токен"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, until):
+        """Telegram попросил подождать (retry_after)"""
+        self.paused_until = max(self.paused_until, until)
+        self.tokens = 0
+
+
+# ==================== ПЛАНИРОВЩИК ИСХОДЯЩИХ ЗАПРОСОВ ====================
+class SendScheduler(BaseRequestMiddleware):
+    """Middleware сессии бота: пропускает запросы к Bot API с учётом лимитов Telegram.
+
+    Общий лимит - global_rate запросов в секунду, лимит чата - group_rate
+    для групп и private_rate для личек. Запросы ждут в очереди с
+    приоритетами, поэтому answerCallbackQuery обгоняет массовые отправки.
+    На 429 запрос повторяется через retry_after, на сетевые и 5xx ошибки -
+    с экспоненциальной задержкой.
+
+    Чаты из unlimited_chats (служебный чат предзагрузки) идут только под
+    общий лимит, но паузы retry_after для них соблюдаются.
+    """
+
+    def __init__(self, global_rate=30, group_rate=20 / 60, private_rate=1, max_retries=5, base_backoff=0.5,
+                 unlimited_chats=()):
+        self.global_rate = global_rate
+        self.group_rate = group_rate
+        self.private_rate = private_rate
+        self.unlimited_chats = {chat_id for chat_id in unlimited_chats if chat_id is not None}
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+
+        now = time.monotonic()
+        self._global = TokenBucket(global_rate, global_rate, now)
+        self._chats = {}        # {chat_id: TokenBucket}
+        self._queue = []        # куча (приоритет, seq, future)
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+
+        # Метрики
+        self.queue_depth_max = 0
+        self.requests = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.retries = 0
+        self.flood_waits = 0
+        self.in_flight = 0      # запросов внутри планировщика: в очереди, в ожидании или в полёте
+
+    # ---------- лимиты чатов ----------
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if chat_id in self.unlimited_chats:
+                bucket = self._chats[chat_id] = TokenBucket(self.global_rate, self.global_rate, now)
+                return bucket
+            is_group = is_group_chat(chat_id)
+            rate = self.group_rate if is_group else self.private_rate
+            # В группе разрешаем небольшой всплеск, в личке - пару сообщений подряд
+            bucket = self._chats[chat_id] = TokenBucket(rate, 3 if is_group else 2, now)
+        return bucket
+
+    async def _acquire_chat(self, chat_id):
+        while True:
+            now = time.monotonic()
+            bucket = self._chat_bucket(chat_id, now)
+            delay = bucket.delay(now)
+            if not delay:
+                bucket.take()
+                return
+            await asyncio.sleep(delay)
+
+    def _prune_chats(self, now):
+        """Полные вёдра ничего не помнят - их можно выбросить"""
+        if len(self._chats) < 10000:
+            return
+        for chat_id, bucket in list(self._chats.items()):
+            if now >= bucket.paused_until and bucket.delay(now) == 0 and bucket.tokens >= bucket.capacity:
+                del self._chats[chat_id]
+
+    # ---------- общая очередь ----------
+    async def _acquire_global(self, priority):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+        future = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self.queue_depth_max = max(self.queue_depth_max, len(self._queue))
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        """Выдаёт разрешения из общей очереди в порядке приоритета"""
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            delay = self._global.delay(now)
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                # Запрос отменили, пока он стоял в очереди
+                continue
+            self._global.take()
+            future.set_result(None)
+            self._prune_chats(now)
+
+    # ---------- middleware ----------
+    async def __call__(self, make_request, bot, method):
+        api_method = method.__api_method__
+        if api_method in UNLIMITED_METHODS:
+            return await make_request(bot, method)
+
+        self.in_flight += 1
+        try:
+            return await self._send(make_request, bot, method, api_method)
+        finally:
+            self.in_flight -= 1
+
+    async def _send(self, make_request, bot, method, api_method):
+        priority = PRIORITY_HIGH if api_method in HIGH_PRIORITY_METHODS else PRIORITY_NORMAL
+        chat_id = getattr(method, "chat_id", None)
+        chat_limited = chat_id is not None and api_method.startswith(CHAT_LIMITED_PREFIXES)
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            if chat_limited:
+                await self._acquire_chat(chat_id)
+            await self._acquire_global(priority)
+            waited = time.monotonic() - started
+            self.requests += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.flood_waits += 1
+                until = time.monotonic() + e.retry_after
+                if chat_limited:
+                    self._chat_bucket(chat_id, time.monotonic()).pause(until)
+                else:
+                    self._global.pause(until)
+                logger.warning("⏳ Flood control на %s, ждём %s с", api_method, e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.base_backoff * 2 ** attempt * (0.5 + random.random())
+                logger.warning("🔁 Ошибка %s: %s. Повтор через %.1f с", api_method, e, delay)
+                await asyncio.sleep(delay)
+            attempt += 1
+            self.retries += 1
+
+    async def drain(self, timeout):
+        """Ждём, пока уйдут все принятые запросы; False - не успели за timeout"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "queue_depth_max": self.queue_depth_max,
+            "requests": self.requests,
+            "wait_time_avg": self.wait_time_total / self.requests if self.requests else 0.0,
+            "wait_time_max": self.wait_time_max,
+            "retries": self.retries,
+            "flood_waits": self.flood_waits,
+        }
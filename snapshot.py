@@ -0,0 +1,118 @@
+import struct
+import time
+import zlib
+from array import array
+
+# Снимок состояния воркера при остановке: языки пользователей и история
+# предсказаний. Колонки лежат массивами array (8 байт на id, 2 на индекс)
+# и сжаты zlib - запись и чтение идут без разбора по записям.
+MAGIC = b"TAROSNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sHHHdIII")  # магия, версия, воркер, воркеров, время, строк, языков, истории
+
+
+class SnapshotError(ValueError):
+    """Снимок повреждён или записан другой версией"""
+
+
+def write_snapshot(path, worker_index, worker_count, languages, draws):
+    """languages - [(user_id, язык)], draws - [(chat_id, карта, язык, индекс, время)].
+
+    Файл пишется рядом и подменяется переименованием, чтобы при падении
+    посреди записи не остался половинчатый снимок. Возвращает размер в байтах.
+    """
+    strings = {}
+
+    def intern(text):
+        number = strings.get(text)
+        if number is None:
+            number = strings[text] = len(strings)
+        return number
+
+    language_users = array("q")
+    language_codes = array("H")
+    for user_id, language in languages:
+        language_users.append(user_id)
+        language_codes.append(intern(language))
+
+    columns = [array("q"), array("H"), array("H"), array("H"), array("d")]
+    for chat_id, card, language, index, timestamp in draws:
+        columns[0].append(chat_id)
+        columns[1].append(intern(card))
+        columns[2].append(intern(language))
+        columns[3].append(index)
+        columns[4].append(timestamp)
+
+    encoded = [text.encode() for text in strings]
+    payload = b"".join(
+        [struct.pack(f"<{len(encoded)}H", *(len(text) for text in encoded)), *encoded,
+         language_users.tobytes(), language_codes.tobytes()]
+        + [column.tobytes() for column in columns]
+    )
+    header = HEADER.pack(MAGIC, VERSION, worker_index, worker_count, time.time(),
+                         len(encoded), len(language_users), len(columns[0]))
+    data = header + zlib.compress(payload, 1)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(path.suffix + ".tmp")
+    temporary.write_bytes(data)
+    temporary.replace(path)
+    return len(data)
+
+
+def read_snapshot(path):
+    """(заголовок, языки, история) в тех же форматах, что у write_snapshot"""
+    data = path.read_bytes()
+    if len(data) < HEADER.size:
+        raise SnapshotError("файл короче заголовка")
+    magic, version, worker_index, worker_count, written_at, string_count, language_count, draw_count = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise SnapshotError(f"неизвестный формат: {magic!r} v{version}")
+    try:
+        payload = zlib.decompress(data[HEADER.size:])
+    except zlib.error as e:
+        raise SnapshotError(f"не удалось распаковать: {e}") from e
+
+    offset = 0
+
+    def take(typecode, count):
+        nonlocal offset
+        column = array(typecode)
+        size = column.itemsize * count
+        column.frombytes(payload[offset:offset + size])
+        offset += size
+        if len(column) != count:
+            raise SnapshotError("данные обрываются")
+        return column
+
+    lengths = take("H", string_count)
+    strings = []
+    for length in lengths:
+        raw = payload[offset:offset + length]
+        if len(raw) != length:
+            raise SnapshotError("данные обрываются")
+        try:
+            strings.append(raw.decode())
+        except UnicodeDecodeError as e:
+            raise SnapshotError(f"повреждена таблица строк: {e}") from e
+        offset += length
+
+    language_users = take("q", language_count)
+    language_codes = take("H", language_count)
+    chat_ids = take("q", draw_count)
+    cards = take("H", draw_count)
+    draw_languages = take("H", draw_count)
+    indexes = take("H", draw_count)
+    timestamps = take("d", draw_count)
+
+    header = {"worker_index": worker_index, "worker_count": worker_count, "written_at": written_at}
+    try:
+        languages = [(user_id, strings[code]) for user_id, code in zip(language_users, language_codes)]
+        draws = [
+            (chat_id, strings[card], strings[language], index, timestamp)
+            for chat_id, card, language, index, timestamp in zip(chat_ids, cards, draw_languages, indexes, timestamps)
+        ]
+    except IndexError as e:
+        raise SnapshotError("ссылка на несуществующую строку") from e
+    return header, languages, draws
@@ -0,0 +1,35 @@
+# ==================== РАСКЛАДЫ ====================
+class Spread:
+    """Расклад из нескольких карт: заголовок и позиции - ключи текстов в locales"""
+    __slots__ = ("name", "title_key", "positions")
+
+    def __init__(self, name, title_key, positions):
+        self.name = name
+        self.title_key = title_key
+        self.positions = tuple(positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+
+# Команда -> расклад. Карты расклада уходят одним альбомом, а Telegram
+# принимает в sendMediaGroup от 2 до 10 фото - поэтому больше 10 позиций нельзя
+SPREADS = {
+    "spread": Spread("spread", "spread_three_title", (
+        "position_past", "position_present", "position_future",
+    )),
+    "celtic": Spread("celtic", "spread_celtic_title", (
+        "position_situation", "position_challenge", "position_foundation", "position_recent_past",
+        "position_crown", "position_near_future", "position_self", "position_environment",
+        "position_hopes", "position_outcome",
+    )),
+}
+MEDIA_GROUP_LIMIT = 10
+# Подпись к фото в Telegram - не длиннее 1024 символов
+CAPTION_LIMIT = 1024
+
+assert all(2 <= len(spread) <= MEDIA_GROUP_LIMIT for spread in SPREADS.values())
+
+
+def fit_caption(text):
+    return text if len(text) <= CAPTION_LIMIT else text[:CAPTION_LIMIT - 1] + "…"
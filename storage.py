@@ -0,0 +1,287 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Кэш помнит и "языка нет", поэтому отсутствие записи отличаем отдельным маркером
+_NOT_CACHED = object()
+
+
+# ==================== ИНТЕРФЕЙС ХРАНИЛИЩА ====================
+class StateStorage(ABC):
+    """Хранилище состояния бота: языки пользователей и история предсказаний.
+
+    Все методы синхронные и не ходят на диск при записи — реализации
+    копят изменения и сбрасывают их пачкой в flush(). Интерфейс
+    укладывается в примитивы Redis: языки — HGET/HSET в хэше
+    "languages", история — ZADD/ZRANGEBYSCORE/ZREMRANGEBYSCORE в
+    отсортированном множестве по времени, сброс карты — DEL по ключу
+    (чат, карта, язык).
+
+    Языки, которые процесс держит в памяти, лежат в self.languages -
+    LRUCache с ограничением по числу пользователей.
+    """
+    languages = None
+
+    @abstractmethod
+    def get_language(self, user_id):
+        """Язык пользователя или None"""
+
+    def warm_languages(self, languages):
+        """Языки из снимка состояния (snapshot.py) - в память процесса, без записи в хранилище"""
+        for user_id, language in languages:
+            self.languages.set(user_id, language)
+
+    @abstractmethod
+    def set_language(self, user_id, language):
+        """Запоминаем выбранный язык"""
+
+    @abstractmethod
+    def add_draw(self, chat_id, card, language, index, timestamp):
+        """Запоминаем выпавшее предсказание"""
+
+    @abstractmethod
+    def reset_draws(self, chat_id, card, language):
+        """Забываем историю карты в чате (все предсказания использованы)"""
+
+    @abstractmethod
+    def load_draws(self, since):
+        """История не старше since: [(chat_id, card, language, index, timestamp)]"""
+
+    def flush(self):
+        """Синхронно записываем накопленные изменения"""
+
+    async def flush_async(self):
+        self.flush()
+
+    async def run_flusher(self, interval):
+        """Фоновая запись накопленных изменений (write-behind)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush_async()
+            except Exception as e:
+                logger.error("Ошибка записи состояния: %s", e)
+
+    def close(self):
+        self.flush()
+
+
+# ==================== ХРАНИЛИЩЕ В ПАМЯТИ ====================
+class MemoryStorage(StateStorage):
+    """Всё в памяти процесса, как раньше: теряется при перезапуске.
+
+    Языков хранится не больше max_languages: давно не заходившие
+    пользователи снова увидят язык по умолчанию.
+    """
+
+    def __init__(self, max_languages=None):
+        self.languages = LRUCache(max_languages)  # {user_id: 'ru'/'en'}
+
+    def get_language(self, user_id):
+        return self.languages.get(user_id)
+
+    def set_language(self, user_id, language):
+        self.languages.set(user_id, language)
+
+    def add_draw(self, chat_id, card, language, index, timestamp):
+        # История живёт в самом PredictionSampler
+        pass
+
+    def reset_draws(self, chat_id, card, language):
+        pass
+
+    def load_draws(self, since):
+        return []
+
+
+# ==================== SQLITE ====================
+class SQLiteStorage(StateStorage):
+    """SQLite в режиме WAL с отложенной пакетной записью.
+
+    Обработчики только складывают изменения в буфер; на диск они
+    попадают из фонового потока в flush_async(). Одну базу могут
+    использовать несколько процессов - тогда через language_cache_ttl
+    секунд язык считается устаревшим и перечитывается из базы.
+    Кэш языков в памяти ограничен max_languages записями и заполняется
+    при создании хранилища.
+
+    Язык, которого нет в кэше, читается сразу - одним запросом по
+    первичному ключу через отдельное соединение: WAL позволяет читать
+    параллельно с записью, поэтому чтение не ждёт сброса буфера.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS languages (
+            user_id INTEGER PRIMARY KEY,
+            language TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS draws (
+            chat_id INTEGER NOT NULL,
+            card TEXT NOT NULL,
+            language TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            timestamp REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS draws_key ON draws (chat_id, card, language);
+        CREATE INDEX IF NOT EXISTS draws_timestamp ON draws (timestamp);
+    """
+
+    def __init__(self, path, history_ttl, language_cache_ttl=None, max_languages=None):
+        self.path = Path(path)
+        self.history_ttl = history_ttl
+        self.language_cache_ttl = language_cache_ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        # Чтения идут через своё соединение и не ждут транзакцию записи
+        self._reader = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._reader.execute("PRAGMA busy_timeout=5000")
+        self._read_lock = threading.Lock()
+
+        self.languages = LRUCache(max_languages)  # {user_id: язык или None}
+        # Метки свежести: язык без метки ещё отдаётся, но уже перечитывается
+        self._fresh = LRUCache(max_languages, language_cache_ttl) if language_cache_ttl else None
+        self._pending_languages = {}  # {user_id: язык} ещё не записанные
+        self._pending_draws = []      # [("draw"/"reset", ...)] в порядке поступления
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.language_reads = 0
+        self._preload_languages(max_languages)
+
+    def _preload_languages(self, limit):
+        """Заполняем кэш языков при создании - его строят в потоке, а не в event loop"""
+        with self._read_lock:
+            rows = self._reader.execute("SELECT user_id, language FROM languages LIMIT ?", (limit or -1,)).fetchall()
+        for user_id, language in rows:
+            self._cache_language(user_id, language)
+
+    def warm_languages(self, languages):
+        """Языки из снимка не нужны: кэш уже заполнен из базы, а она источник истины.
+
+        Снимок мог быть записан раньше, чем другой воркер сменил язык в базе.
+        """
+
+    def _cache_language(self, user_id, language):
+        self.languages.set(user_id, language)
+        if self._fresh is not None:
+            self._fresh.set(user_id, True)
+
+    def _read_language(self, user_id):
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT language FROM languages WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_language(self, user_id):
+        if user_id in self._pending_languages:
+            return self._pending_languages[user_id]
+        cached = self.languages.get(user_id, _NOT_CACHED)
+        if cached is not _NOT_CACHED and (self._fresh is None or user_id in self._fresh):
+            return cached
+        # Язык вытеснили из кэша или его мог сменить соседний воркер:
+        # без него весь ответ ушёл бы на языке по умолчанию
+        self.language_reads += 1
+        try:
+            language = self._read_language(user_id)
+        except sqlite3.Error as e:
+            logger.error("Ошибка чтения языка %s: %s", user_id, e)
+            return None if cached is _NOT_CACHED else cached
+        self._cache_language(user_id, language)
+        return language
+
+    def set_language(self, user_id, language):
+        self._cache_language(user_id, language)
+        self._pending_languages[user_id] = language
+
+    def add_draw(self, chat_id, card, language, index, timestamp):
+        self._pending_draws.append(("draw", chat_id, card, language, index, timestamp))
+
+    def reset_draws(self, chat_id, card, language):
+        self._pending_draws.append(("reset", chat_id, card, language))
+
+    def load_draws(self, since):
+        self.flush()
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chat_id, card, language, idx, timestamp FROM draws "
+                "WHERE timestamp >= ? ORDER BY timestamp", (since,)
+            ).fetchall()
+
+    def _take_pending(self):
+        """Забираем буферы целиком; вызывается в потоке event loop"""
+        languages, self._pending_languages = self._pending_languages, {}
+        draws, self._pending_draws = self._pending_draws, []
+        return languages, draws
+
+    def _write(self, languages, draws):
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN")
+            try:
+                if languages:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO languages (user_id, language) VALUES (?, ?)",
+                        languages.items()
+                    )
+                for op in draws:
+                    if op[0] == "draw":
+                        conn.execute(
+                            "INSERT INTO draws (chat_id, card, language, idx, timestamp) VALUES (?, ?, ?, ?, ?)",
+                            op[1:]
+                        )
+                    else:
+                        conn.execute(
+                            "DELETE FROM draws WHERE chat_id = ? AND card = ? AND language = ?",
+                            op[1:]
+                        )
+                conn.execute("DELETE FROM draws WHERE timestamp < ?", (time.time() - self.history_ttl,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self.flushes += 1
+        self.flushed_rows += len(languages) + len(draws)
+
+    def flush(self):
+        languages, draws = self._take_pending()
+        self._write(languages, draws)
+
+    async def flush_async(self):
+        languages, draws = self._take_pending()
+        try:
+            await asyncio.to_thread(self._write, languages, draws)
+        except Exception:
+            # Возвращаем пачку в буфер, чтобы записать её в следующий раз
+            languages.update(self._pending_languages)
+            self._pending_languages = languages
+            self._pending_draws = draws + self._pending_draws
+            raise
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+        with self._read_lock:
+            self._reader.close()
+
+
+def create_storage(kind, path, history_ttl, language_cache_ttl=None, max_languages=None):
+    if kind == "memory":
+        return MemoryStorage(max_languages)
+    if kind == "sqlite":
+        return SQLiteStorage(path, history_ttl, language_cache_ttl, max_languages)
+    raise ValueError(f"Неизвестный тип хранилища: {kind}")
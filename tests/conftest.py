@@ -0,0 +1,16 @@
+import pytest
+
+
+class Clock:
+    """Подменяемые часы: тесты двигают now вручную"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
@@ -0,0 +1,41 @@
+import datetime
+import hashlib
+
+from daily import daily_seeds
+from tools.daily_uniformity import chi_square, chi_square_critical
+
+DECK_KEY = hashlib.blake2b(b"deck", digest_size=32).digest()
+FIRST_DAY = datetime.date(2025, 1, 1)
+DAYS = [FIRST_DAY + datetime.timedelta(days=i) for i in range(7)]
+USERS = range(1, 20001)
+CARDS = 22
+PREDICTIONS = 30
+
+
+def test_same_answer_for_same_user_and_day():
+    assert daily_seeds(42, FIRST_DAY, DECK_KEY) == daily_seeds(42, FIRST_DAY, DECK_KEY)
+    assert daily_seeds(42, FIRST_DAY, DECK_KEY) != daily_seeds(42, DAYS[1], DECK_KEY)
+
+
+def test_cards_and_predictions_are_uniform():
+    # Хэш детерминирован, поэтому проверка на фиксированном диапазоне не бывает случайно красной
+    card_counts = [0] * CARDS
+    prediction_counts = [0] * PREDICTIONS
+    for user_id in USERS:
+        for day in DAYS:
+            card_seed, prediction_seed = daily_seeds(user_id, day, DECK_KEY)
+            card_counts[card_seed % CARDS] += 1
+            prediction_counts[prediction_seed % PREDICTIONS] += 1
+
+    assert chi_square(card_counts) < chi_square_critical(CARDS - 1)
+    assert chi_square(prediction_counts) < chi_square_critical(PREDICTIONS - 1)
+
+
+def test_new_deck_reshuffles_cards():
+    other_key = hashlib.blake2b(b"deck v2", digest_size=32).digest()
+    changed = sum(
+        daily_seeds(user_id, FIRST_DAY, DECK_KEY)[0] % CARDS != daily_seeds(user_id, FIRST_DAY, other_key)[0] % CARDS
+        for user_id in USERS
+    )
+    # У независимого выбора карта меняется с вероятностью 1 - 1/22
+    assert abs(changed / len(USERS) - (1 - 1 / CARDS)) < 0.01
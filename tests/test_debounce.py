@@ -0,0 +1,36 @@
+from debounce import PressDebouncer
+
+
+def test_only_first_press_claims_the_spread():
+    debouncer = PressDebouncer()
+    assert debouncer.claim(-100, 7)
+    assert not debouncer.claim(-100, 7)
+    assert not debouncer.claim(-100, 7)
+    # Другое сообщение или другой чат - свой расклад
+    assert debouncer.claim(-100, 8)
+    assert debouncer.claim(5, 7)
+    assert debouncer.duplicate_presses == 2
+
+
+def test_claim_expires(clock):
+    debouncer = PressDebouncer(clock=clock)
+    assert debouncer.claim(5, 7)
+    clock.now += 3601
+    assert debouncer.claim(5, 7)
+
+
+def test_tarot_cooldown_per_user_and_chat(clock):
+    debouncer = PressDebouncer(tarot_cooldown=5, clock=clock)
+    assert debouncer.allow_tarot(-100, 1)
+    assert not debouncer.allow_tarot(-100, 1)
+    assert debouncer.allow_tarot(-100, 2)
+    assert debouncer.allow_tarot(5, 1)
+    clock.now += 5.1
+    assert debouncer.allow_tarot(-100, 1)
+    assert debouncer.cooldown_hits == 1
+
+
+def test_no_cooldown_when_disabled():
+    debouncer = PressDebouncer(tarot_cooldown=0)
+    assert all(debouncer.allow_tarot(5, 1) for _ in range(3))
+    assert debouncer.cooldown_hits == 0
@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+from aiogram.types import FSInputFile
+
+import bot as tarot_bot
+from file_cache import FileIdCache
+
+
+def make_image(tmp_path, content=b"card"):
+    path = tmp_path / "the_fool.png"
+    path.write_bytes(content)
+    return path
+
+
+async def watch_once(cache, path):
+    task = asyncio.create_task(cache.watch(lambda: [path], 60))
+    await asyncio.sleep(0.1)
+    task.cancel()
+
+
+def test_file_ids_survive_restart(tmp_path):
+    path = make_image(tmp_path)
+    cache = FileIdCache(tmp_path / "file_ids.json")
+    cache.put(path, "id-1")
+    assert cache.get(path) == "id-1"
+    cache.flush()
+
+    reloaded = FileIdCache(tmp_path / "file_ids.json")
+    assert reloaded.get(path) == "id-1"
+    assert path in reloaded
+
+
+def test_replaced_image_is_uploaded_again(tmp_path):
+    path = make_image(tmp_path)
+    cache = FileIdCache(tmp_path / "file_ids.json")
+    asyncio.run(watch_once(cache, path))
+    cache.put(path, "id-1")
+
+    path.write_bytes(b"new card")
+    asyncio.run(watch_once(cache, path))
+    assert cache.get(path) is None
+    assert cache.misses == 1
+
+
+class StubBot:
+    """Bot с send_photo, который не принимает file_id "stale" """
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.sent.append(photo)
+        if photo == "stale":
+            raise TelegramBadRequest(SendPhoto(chat_id=chat_id, photo=photo), "wrong file identifier/HTTP URL specified")
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="fresh")])
+
+
+def test_rejected_file_id_is_reuploaded(tmp_path, monkeypatch):
+    path = make_image(tmp_path)
+    cache = FileIdCache(tmp_path / "file_ids.json")
+    cache.put(path, "stale")
+    stub = StubBot()
+    monkeypatch.setattr(tarot_bot, "bot", stub)
+    monkeypatch.setattr(tarot_bot, "file_cache", cache)
+    monkeypatch.setattr(tarot_bot, "assets", SimpleNamespace(resolve=lambda path: path))
+
+    assert asyncio.run(tarot_bot._send_photo_safe(5, path))
+    assert stub.sent[0] == "stale"
+    assert isinstance(stub.sent[1], FSInputFile)
+    assert cache.get(path) == "fresh"
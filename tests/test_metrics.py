@@ -0,0 +1,20 @@
+import pytest
+
+from metrics import Metrics
+
+
+def test_live_counter_renders_as_counter():
+    metrics = Metrics()
+    hits = [3]
+    metrics.counter("tarot_file_id_cache_hits_total", "Отправки фото по file_id", lambda: hits[0])
+    metrics.gauge("tarot_deck_cards", "Карт с предсказаниями", lambda: 22)
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE tarot_file_id_cache_hits_total counter" in lines
+    assert "tarot_file_id_cache_hits_total 3" in lines
+    assert "# TYPE tarot_deck_cards gauge" in lines
+
+
+def test_counter_name_needs_total_suffix():
+    with pytest.raises(ValueError):
+        Metrics().counter("tarot_file_id_cache_hits", "Отправки фото по file_id", lambda: 0)
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+from catalog import CardCatalog
+from predictions import PredictionsError, validate
+
+
+def make_deck(tmp_path, cards, predictions):
+    open_dir = tmp_path / "open"
+    backs_dir = tmp_path / "backs"
+    open_dir.mkdir()
+    backs_dir.mkdir()
+    (backs_dir / "back.png").write_bytes(b"")
+    for card in cards:
+        (open_dir / f"{card}.png").write_bytes(b"")
+    predictions_file = tmp_path / "predictions.json"
+    predictions_file.write_text(json.dumps(predictions), encoding="utf-8")
+    return CardCatalog(open_dir, backs_dir, predictions_file)
+
+
+def reload(catalog, predictions):
+    catalog.predictions_file.write_text(json.dumps(predictions), encoding="utf-8")
+    return asyncio.run(catalog.reload_predictions())
+
+
+def test_validate_requires_default_language():
+    with pytest.raises(PredictionsError, match="ru"):
+        validate({"the_fool": {"en": ["Soon"]}})
+
+
+def test_validate_rejects_case_colliding_cards():
+    with pytest.raises(PredictionsError, match="повторяется"):
+        validate({"The_Fool": {"ru": ["Скоро"]}, "the_fool": {"ru": ["Завтра"]}})
+
+
+def test_validate_checks_images_only_for_new_cards():
+    data = {"the_fool": {"ru": ["Скоро"]}, "the_star": {"ru": ["Завтра"]}}
+    with pytest.raises(PredictionsError, match="the_star"):
+        validate(data, card_images={"the_fool"})
+    assert set(validate(data, card_images={"the_fool"}, known_cards={"the_star"})) == {"the_fool", "the_star"}
+
+
+def test_startup_accepts_predictions_without_images(tmp_path):
+    catalog = make_deck(tmp_path, ["the_fool"], {"the_fool": {"ru": ["Скоро"]}, "the_star": {"ru": ["Завтра"]}})
+    assert "the_star" in catalog.predictions
+    assert [card.stem for card in catalog.cards] == ["the_fool"]
+
+
+def test_reload_with_unknown_card_keeps_old_table(tmp_path):
+    catalog = make_deck(tmp_path, ["the_fool"], {"the_fool": {"ru": ["Скоро"]}})
+    old = catalog.predictions
+    # Опечатка в имени карты
+    assert not reload(catalog, {"the_fool": {"ru": ["Скоро"]}, "the_fol": {"ru": ["Завтра"]}})
+    assert catalog.predictions is old
+    assert catalog.reload_failures == 1
+
+
+def test_reload_without_default_language_keeps_old_table(tmp_path):
+    catalog = make_deck(tmp_path, ["the_fool"], {"the_fool": {"ru": ["Скоро"]}})
+    old = catalog.predictions
+    assert not reload(catalog, {"the_fool": {"en": ["Soon"]}})
+    assert catalog.predictions is old
+
+
+def test_reload_swaps_valid_table(tmp_path):
+    catalog = make_deck(tmp_path, ["the_fool"], {"the_fool": {"ru": ["Скоро"]}, "the_star": {"ru": ["Завтра"]}})
+    # the_star была без картинки ещё при запуске - это не мешает перезагрузке
+    assert reload(catalog, {"the_fool": {"ru": ["Скоро", "Завтра"]}, "the_star": {"ru": ["Завтра"]}})
+    assert catalog.predictions.count("the_fool", "ru") == 2
+    assert catalog.reloads == 1
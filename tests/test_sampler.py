@@ -0,0 +1,65 @@
+from sampler import PredictionSampler
+
+TTL = 60
+
+
+def draw_all(sampler, size, chat_id=1, card="the_fool", lang="ru"):
+    return [sampler.draw(chat_id, card, lang, size) for _ in range(size)]
+
+
+def test_bag_refills_after_exhaustion(clock):
+    sampler = PredictionSampler(TTL, clock=clock)
+    assert sorted(draw_all(sampler, 5)) == list(range(5))
+    assert len(sampler) == 5
+    # Все предсказания выпали - мешок наполняется заново
+    assert sampler.draw(1, "the_fool", "ru", 5) in range(5)
+    assert len(sampler) == 1
+
+
+def test_expired_index_returns_to_bag(clock):
+    sampler = PredictionSampler(TTL, clock=clock)
+    first = sampler.draw(1, "the_fool", "ru", 3)
+    clock.now += 10
+    rest = [sampler.draw(1, "the_fool", "ru", 3) for _ in range(2)]
+    assert sampler.expire(clock.now + TTL - 5) == 1
+    assert len(sampler) == 2
+    # Свободен только истёкший индекс
+    assert sampler.draw(1, "the_fool", "ru", 3) == first
+    assert first not in rest
+
+
+def test_size_change_resets_bag(clock):
+    sampler = PredictionSampler(TTL, clock=clock)
+    draw_all(sampler, 3)
+    # После перезагрузки predictions.json у карты стало больше предсказаний
+    assert sorted(draw_all(sampler, 4)) == list(range(4))
+    assert len(sampler) == 4
+    assert sampler.expire(float("inf")) == 4
+    assert sampler.active_chats == 0
+
+
+def test_restore_from_snapshot_gives_same_state(clock):
+    sampler = PredictionSampler(TTL, clock=clock)
+    for chat_id in (1, 2):
+        sampler.draw(chat_id, "the_fool", "ru", 4)
+        clock.now += 1
+        sampler.draw(chat_id, "the_star", "en", 3)
+        clock.now += 1
+    draws = sampler.snapshot()
+
+    restored = PredictionSampler(TTL, clock=clock)
+    assert restored.restore(draws, lambda card, lang: 4 if card == "the_fool" else 3) == len(draws)
+    assert restored.snapshot() == draws
+    assert len(restored) == len(sampler)
+    assert restored.active_chats == sampler.active_chats
+
+
+def test_restore_skips_expired_and_out_of_range_draws(clock):
+    sampler = PredictionSampler(TTL, clock=clock)
+    draws = [
+        (1, "the_fool", "ru", 0, clock.now - TTL - 1),
+        (1, "the_fool", "ru", 7, clock.now),
+        (1, "the_fool", "ru", 1, clock.now),
+    ]
+    assert sampler.restore(draws, lambda card, lang: 4) == 1
+    assert sampler.snapshot() == [draws[2]]
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+
+from scheduler import SendScheduler, is_group_chat
+
+
+class StubApi:
+    """make_request для SendScheduler: записывает вызовы и бросает заранее заданные ошибки"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    async def __call__(self, bot, method):
+        self.calls.append((method.__api_method__, time.monotonic()))
+        if self.errors:
+            raise self.errors.pop(0)
+        return True
+
+
+def send(chat_id=1):
+    return SendMessage(chat_id=chat_id, text="🔮")
+
+
+def test_group_detection():
+    assert is_group_chat(-100123)
+    assert is_group_chat("@tarot_channel")
+    assert is_group_chat("-100123")
+    assert not is_group_chat(123456)
+    assert not is_group_chat("123456")
+
+
+def test_retry_after_pauses_chat_and_retries():
+    scheduler = SendScheduler()
+    api = StubApi(TelegramRetryAfter(send(), "Too Many Requests", retry_after=1))
+
+    assert asyncio.run(scheduler(api, None, send()))
+    assert len(api.calls) == 2
+    assert api.calls[1][1] - api.calls[0][1] >= 0.9
+    assert (scheduler.flood_waits, scheduler.retries) == (1, 1)
+
+
+@pytest.mark.parametrize("error", [TelegramNetworkError, TelegramServerError])
+def test_network_and_server_errors_back_off(error):
+    scheduler = SendScheduler(private_rate=100, base_backoff=0.01)
+    api = StubApi(error(send(), "Bad Gateway"), error(send(), "Bad Gateway"))
+
+    assert asyncio.run(scheduler(api, None, send()))
+    assert len(api.calls) == 3
+    assert scheduler.retries == 2
+    assert scheduler.flood_waits == 0
+
+
+def test_gives_up_after_max_retries():
+    scheduler = SendScheduler(private_rate=100, max_retries=1, base_backoff=0.01)
+    api = StubApi(*(TelegramServerError(send(), "Bad Gateway") for _ in range(3)))
+
+    with pytest.raises(TelegramServerError):
+        asyncio.run(scheduler(api, None, send()))
+    assert len(api.calls) == 2
+    assert scheduler.in_flight == 0
+
+
+def test_callback_answer_overtakes_queued_sends():
+    scheduler = SendScheduler(global_rate=20)
+    # Общий лимит исчерпан - все запросы встают в очередь
+    scheduler._global.tokens = 0
+    api = StubApi()
+
+    async def run():
+        sends = [scheduler(api, None, send(chat_id)) for chat_id in range(1, 5)]
+        answer = scheduler(api, None, AnswerCallbackQuery(callback_query_id="1"))
+        await asyncio.gather(*sends, answer)
+
+    asyncio.run(run())
+    assert api.calls[0][0] == "answerCallbackQuery"
+    assert len(api.calls) == 5
+
+
+def test_unlimited_chat_skips_per_chat_limit():
+    scheduler = SendScheduler(unlimited_chats=[123456])
+    api = StubApi()
+
+    async def run():
+        await asyncio.gather(*(scheduler(api, None, send(123456)) for _ in range(8)))
+
+    started = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - started < 0.5
+
+
+def test_drain_waits_for_accepted_requests():
+    scheduler = SendScheduler()
+    release = asyncio.Event()
+
+    async def slow_request(bot, method):
+        await release.wait()
+        return True
+
+    async def run():
+        request = asyncio.create_task(scheduler(slow_request, None, send()))
+        await asyncio.sleep(0)
+        assert scheduler.in_flight == 1
+        assert not await scheduler.drain(0.1)
+        release.set()
+        assert await scheduler.drain(1)
+        assert await request
+
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import zlib
+
+import pytest
+
+from snapshot import HEADER, SnapshotError, read_snapshot, write_snapshot
+
+
+def test_snapshot_file_round_trip(tmp_path):
+    path = tmp_path / "state.bin"
+    languages = [(1, "ru"), (2, "en"), (-100123, "ru")]
+    draws = [(1, "the_fool", "ru", 3, 1000.5), (-100123, "the_star", "en", 0, 1001.25)]
+    assert write_snapshot(path, 1, 2, languages, draws) == path.stat().st_size
+
+    header, read_languages, read_draws = read_snapshot(path)
+    assert (header["worker_index"], header["worker_count"]) == (1, 2)
+    assert read_languages == languages
+    assert read_draws == draws
+
+
+def rewrite_payload(path, change):
+    data = path.read_bytes()
+    payload = bytearray(zlib.decompress(data[HEADER.size:]))
+    change(payload)
+    path.write_bytes(data[:HEADER.size] + zlib.compress(bytes(payload)))
+
+
+def test_corrupt_string_table_raises_snapshot_error(tmp_path):
+    path = tmp_path / "state.bin"
+    write_snapshot(path, 0, 1, [(1, "ru")], [(1, "the_fool", "ru", 0, 1000.0)])
+    # Первая строка начинается сразу после длин строк (по 2 байта на строку)
+    rewrite_payload(path, lambda payload: payload.__setitem__(slice(4, 5), b"\xff"))
+
+    with pytest.raises(SnapshotError):
+        read_snapshot(path)
+
+
+def test_string_index_out_of_range_raises_snapshot_error(tmp_path):
+    path = tmp_path / "state.bin"
+    write_snapshot(path, 0, 1, [(1, "ru")], [])
+
+    def break_language_code(payload):
+        # Код языка - последние два байта: единственная строка имеет номер 0
+        payload[-2:] = (7).to_bytes(2, "little")
+
+    rewrite_payload(path, break_language_code)
+    with pytest.raises(SnapshotError):
+        read_snapshot(path)
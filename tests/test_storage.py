@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from sampler import PredictionSampler
+from storage import SQLiteStorage
+
+TTL = 60
+
+
+def test_sqlite_storage_round_trip(tmp_path, clock):
+    # Устаревшую историю хранилище чистит по настоящему времени
+    clock.now = time.time()
+    storage = SQLiteStorage(tmp_path / "state.db", TTL)
+    sampler = PredictionSampler(TTL, storage=storage, clock=clock)
+    for _ in range(3):
+        sampler.draw(1, "the_fool", "ru", 3)
+    clock.now += 1
+    # Мешок исчерпан: старая история карты стирается при сбросе
+    sampler.draw(1, "the_fool", "ru", 3)
+    storage.set_language(5, "en")
+    storage.flush()
+    storage.close()
+
+    storage = SQLiteStorage(tmp_path / "state.db", TTL)
+    try:
+        assert storage.get_language(5) == "en"
+        draws = storage.load_draws(clock.now - TTL)
+        assert draws == sampler.snapshot()
+        restored = PredictionSampler(TTL, clock=clock)
+        assert restored.restore(draws, lambda card, lang: 3) == 1
+    finally:
+        storage.close()
+
+
+def test_language_cache_miss_reads_database_inside_event_loop(tmp_path):
+    other = SQLiteStorage(tmp_path / "state.db", TTL)
+    storage = SQLiteStorage(tmp_path / "state.db", TTL, max_languages=1)
+
+    async def handler():
+        # Язык выбран в соседнем воркере, а у этого процесса его нет в кэше
+        other.set_language(5, "en")
+        other.flush()
+        assert storage.get_language(5) == "en"
+        # Вытесненный из кэша язык тоже читается из базы, а не заменяется языком по умолчанию
+        storage.set_language(6, "ru")
+        storage.flush()
+        assert storage.get_language(5) == "en"
+        assert storage.get_language(7) is None
+
+    try:
+        asyncio.run(handler())
+    finally:
+        storage.close()
+        other.close()
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from webhook import FRAME_HEADER, UpdateRouter, chat_id_of
+
+
+class FakeRequest:
+    headers = {}
+
+    def __init__(self, update):
+        self.body = json.dumps(update).encode()
+
+    async def read(self):
+        return self.body
+
+
+def update_for(chat_id, update_id=1):
+    return {"update_id": update_id, "message": {"message_id": 1, "date": 0, "chat": {"id": chat_id}}}
+
+
+def test_chat_id_of():
+    assert chat_id_of(update_for(-100)) == -100
+    assert chat_id_of({"update_id": 1, "callback_query": {"from": {"id": 5}, "message": {"chat": {"id": 7}}}}) == 7
+    assert chat_id_of({"update_id": 1, "inline_query": {"from": {"id": 5}}}) == 5
+
+
+def test_dead_worker_gets_503_until_reconnected(tmp_path):
+    socket_path = str(tmp_path / "worker0.sock")
+
+    async def run():
+        received = []
+        connections = []
+
+        async def worker(reader, writer):
+            connections.append(writer)
+            while True:
+                try:
+                    header = await reader.readexactly(FRAME_HEADER.size)
+                    received.append(json.loads(await reader.readexactly(FRAME_HEADER.unpack(header)[0])))
+                except asyncio.IncompleteReadError:
+                    break
+
+        server = await asyncio.start_unix_server(worker, path=socket_path)
+        router = UpdateRouter([socket_path])
+        await router.connect(timeout=1)
+        await asyncio.sleep(0.05)
+        assert (await router.handle(FakeRequest(update_for(1, 1)))).status == 200
+        await asyncio.sleep(0.05)
+
+        # Воркер умер: соединение закрыто, новых не принимаем
+        server.close()
+        await server.wait_closed()
+        for writer in connections:
+            writer.close()
+        await asyncio.sleep(0.1)
+        assert (await router.handle(FakeRequest(update_for(1, 2)))).status == 503
+
+        # Перезапущенный воркер снова слушает тот же сокет
+        server = await asyncio.start_unix_server(worker, path=socket_path)
+        for _ in range(50):
+            if router.writers[0] is not None:
+                break
+            await asyncio.sleep(0.1)
+        assert (await router.handle(FakeRequest(update_for(1, 3)))).status == 200
+        await asyncio.sleep(0.1)
+        await router.close()
+        server.close()
+        return [update["update_id"] for update in received]
+
+    assert asyncio.run(run()) == [1, 3]
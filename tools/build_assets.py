@@ -0,0 +1,165 @@
+"""Сборка пережатых вариантов картинок колоды.
+
+Для каждой картинки из images/open и images/backs собираются варианты
+в разрешении фото Telegram (не больше 1280 px по длинной стороне):
+PNG с optimize, JPEG (если у картинки нет прозрачности) и, по желанию,
+WebP. Имена файлов содержат хэш содержимого, индекс пишется в
+images/variants/index.json и подхватывается ботом (assets.AssetIndex).
+Пересобираются только картинки, у которых изменился исходник.
+
+Нужен Pillow: pip install Pillow
+Запуск: python -m tools.build_assets [--formats png jpeg webp] [--quality 85] [--force]
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+from pathlib import Path
+
+from assets import sha256_file
+from catalog import scan_images
+
+ROOT = Path(__file__).resolve().parent.parent
+SOURCE_DIRS = (Path("images/open"), Path("images/backs"))
+OUTPUT_DIR = Path("images/variants")
+INDEX_FILE = OUTPUT_DIR / "index.json"
+
+# Telegram хранит фото не больше 1280 px по длинной стороне
+TELEGRAM_PHOTO_SIDE = 1280
+EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+
+def has_alpha(image):
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        return image.convert("RGBA").getextrema()[3][0] < 255
+    return False
+
+
+def encode(image, fmt, quality):
+    buffer = io.BytesIO()
+    if fmt == "png":
+        image.save(buffer, "PNG", optimize=True)
+    elif fmt == "jpeg":
+        image.convert("RGB").save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "webp":
+        image.save(buffer, "WEBP", quality=quality, method=6)
+    return buffer.getvalue()
+
+
+def build_variants(source, formats, quality):
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image.load()
+        image.thumbnail((TELEGRAM_PHOTO_SIDE, TELEGRAM_PHOTO_SIDE))
+        transparent = has_alpha(image)
+        if not transparent and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        variants = []
+        for fmt in formats:
+            if fmt == "jpeg" and transparent:
+                # JPEG потерял бы прозрачность рубашки
+                continue
+            data = encode(image, fmt, quality)
+            digest = hashlib.sha256(data).hexdigest()
+            name = f"{source.parent.name}_{source.stem}.{digest[:12]}.{EXTENSIONS[fmt]}"
+            (OUTPUT_DIR / name).write_bytes(data)
+            variants.append({
+                "file": name,
+                "format": fmt,
+                "bytes": len(data),
+                "sha256": digest,
+                "width": image.width,
+                "height": image.height,
+            })
+        return variants
+
+
+def load_index():
+    try:
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)["sources"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def save_index(sources):
+    tmp_file = INDEX_FILE.with_suffix(".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"sources": sources}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_file, INDEX_FILE)
+
+
+def is_fresh(entry, digest, formats, quality):
+    return (
+        entry is not None
+        and entry["source_sha256"] == digest
+        and entry["formats"] == formats
+        and entry["quality"] == quality
+        and all((OUTPUT_DIR / variant["file"]).exists() for variant in entry["variants"])
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка пережатых вариантов картинок колоды")
+    parser.add_argument("--formats", nargs="+", choices=list(EXTENSIONS), default=["png", "jpeg"])
+    parser.add_argument("--quality", type=int, default=85, help="качество JPEG и WebP")
+    parser.add_argument("--force", action="store_true", help="пересобрать всё")
+    args = parser.parse_args()
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        sys.exit("❌ Для сборки вариантов нужен Pillow: pip install Pillow")
+
+    os.chdir(ROOT)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    old_index = load_index()
+    sources = {}
+    rebuilt = 0
+    for folder in SOURCE_DIRS:
+        for source in scan_images(folder):
+            name = source.as_posix()
+            digest = sha256_file(source)
+            entry = old_index.get(name)
+            if args.force or not is_fresh(entry, digest, args.formats, args.quality):
+                entry = {
+                    "source_sha256": digest,
+                    "source_bytes": source.stat().st_size,
+                    "formats": args.formats,
+                    "quality": args.quality,
+                    "variants": build_variants(source, args.formats, args.quality),
+                }
+                rebuilt += 1
+            sources[name] = entry
+
+    save_index(sources)
+
+    # Варианты удалённых и пересобранных картинок больше не нужны
+    referenced = {variant["file"] for entry in sources.values() for variant in entry["variants"]}
+    removed = 0
+    for path in OUTPUT_DIR.iterdir():
+        if path != INDEX_FILE and path.name not in referenced:
+            path.unlink()
+            removed += 1
+
+    total_source = total_best = 0
+    print(f"{'картинка':<40} {'исходник':>10} {'лучший':>10} {'формат':>7} {'экономия':>9}")
+    for name, entry in sources.items():
+        best = min(entry["variants"], key=lambda variant: variant["bytes"], default=None)
+        best_bytes = min(best["bytes"], entry["source_bytes"]) if best else entry["source_bytes"]
+        best_format = best["format"] if best and best["bytes"] < entry["source_bytes"] else "исх."
+        total_source += entry["source_bytes"]
+        total_best += best_bytes
+        print(f"{name:<40} {entry['source_bytes'] / 1024:>8.0f}КБ {best_bytes / 1024:>8.0f}КБ {best_format:>7} "
+              f"{(1 - best_bytes / entry['source_bytes']) * 100:>8.1f}%")
+    print(f"Итого: {total_source / 1024:.0f} КБ -> {total_best / 1024:.0f} КБ "
+          f"(экономия {(total_source - total_best) / 1024:.0f} КБ), "
+          f"пересобрано {rebuilt}, удалено устаревших файлов {removed}")
+
+
+if __name__ == "__main__":
+    main()
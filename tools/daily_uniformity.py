@@ -0,0 +1,96 @@
+"""Проверка равномерности карты дня (daily.py).
+
+Для пользователей подряд и нескольких дат считает, сколько раз выпала
+каждая карта и каждое предсказание, и сравнивает с равномерным
+распределением по хи-квадрату. Заодно проверяет, что карта меняется ото
+дня ко дню и при смене колоды так же часто, как у независимого выбора.
+Код выхода 1 - распределение не прошло проверку.
+
+Запуск: python -m tools.daily_uniformity --users 100000 --days 7
+"""
+import argparse
+import datetime
+import hashlib
+import math
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from daily import daily_seeds  # noqa: E402
+
+# Квантиль стандартного нормального для уровня значимости 0.001
+Z_0001 = 3.090
+
+
+def chi_square(counts):
+    expected = sum(counts) / len(counts)
+    return sum((count - expected) ** 2 / expected for count in counts)
+
+
+def chi_square_critical(degrees):
+    """Критическое значение хи-квадрата при p=0.001 (приближение Уилсона - Хилферти)"""
+    k = 2 / (9 * degrees)
+    return degrees * (1 - k + Z_0001 * math.sqrt(k)) ** 3
+
+
+def check_counts(name, counts):
+    statistic = chi_square(counts)
+    critical = chi_square_critical(len(counts) - 1)
+    passed = statistic < critical
+    print(f"{name:<36} хи-квадрат {statistic:9.1f}  (порог {critical:.1f})  {'OK' if passed else 'ПРОВАЛ'}")
+    return passed
+
+
+def check_change_rate(name, changed, total, cards):
+    """Доля смен карты должна быть около 1 - 1/cards; допуск - шесть сигм"""
+    expected = 1 - 1 / cards
+    sigma = math.sqrt(expected * (1 - expected) / total)
+    rate = changed / total
+    passed = abs(rate - expected) < 6 * sigma
+    print(f"{name:<36} {rate:.4f}  (ожидается {expected:.4f})  {'OK' if passed else 'ПРОВАЛ'}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Равномерность карты дня")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--cards", type=int, default=22)
+    parser.add_argument("--predictions", type=int, default=30)
+    args = parser.parse_args()
+
+    deck_key = hashlib.blake2b(b"deck", digest_size=32).digest()
+    other_deck_key = hashlib.blake2b(b"deck v2", digest_size=32).digest()
+    first_day = datetime.date(2025, 1, 1)
+    days = [first_day + datetime.timedelta(days=i) for i in range(args.days)]
+
+    card_counts = [0] * args.cards
+    prediction_counts = [0] * args.predictions
+    day_changes = deck_changes = 0
+    for user_id in range(1, args.users + 1):
+        previous = None
+        for day in days:
+            card_seed, prediction_seed = daily_seeds(user_id, day, deck_key)
+            card = card_seed % args.cards
+            card_counts[card] += 1
+            prediction_counts[prediction_seed % args.predictions] += 1
+            if previous is not None and card != previous:
+                day_changes += 1
+            previous = card
+        if daily_seeds(user_id, first_day, other_deck_key)[0] % args.cards != daily_seeds(user_id, first_day, deck_key)[0] % args.cards:
+            deck_changes += 1
+
+    draws = args.users * args.days
+    print(f"Пользователей {args.users}, дней {args.days}, выборов {draws}")
+    results = [
+        check_counts(f"карты ({args.cards})", card_counts),
+        check_counts(f"предсказания ({args.predictions})", prediction_counts),
+        check_change_rate("смена карты на следующий день", day_changes, args.users * (args.days - 1), args.cards),
+        check_change_rate("смена карты при новой колоде", deck_changes, args.users, args.cards),
+    ]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
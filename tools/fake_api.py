@@ -0,0 +1,174 @@
+"""Локальный фейковый Telegram Bot API для тестов и нагрузочных прогонов.
+
+Запуск: python -m tools.fake_api --port 8081
+Бот подключается к нему через TELEGRAM_API_URL=http://127.0.0.1:8081
+"""
+import argparse
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class FakeBotAPI:
+    """Минимальная имитация Bot API: отвечает на нужные боту методы и считает вызовы"""
+
+    def __init__(self, flood_rate=0.0, retry_after=1):
+        # Доля запросов на отправку, которым отвечаем 429 Too Many Requests
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.floods = 0
+        self.calls = Counter()       # {метод: количество}
+        self.uploads = 0             # сколько раз фото пришло файлом
+        self.upload_bytes = 0
+        self.file_ids = set()        # выданные file_id
+        self.rejected_file_ids = 0
+        self.inline_results = 0      # сколько результатов ушло в answerInlineQuery
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+
+    # ---------- вспомогательное ----------
+    def _chat(self, chat_id):
+        chat_id = int(chat_id)
+        return {"id": chat_id, "type": "private" if chat_id > 0 else "group", "title": "fake"}
+
+    def _message(self, chat_id, **extra):
+        message = {"message_id": next(self._message_ids), "date": int(time.time()), "chat": self._chat(chat_id)}
+        message.update(extra)
+        return message
+
+    def _new_photo(self):
+        file_id = f"fake-photo-{next(self._file_ids)}"
+        self.file_ids.add(file_id)
+        return [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 1200}]
+
+    @staticmethod
+    def ok(result):
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def error(code, description, **parameters):
+        payload = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            payload["parameters"] = parameters
+        return web.json_response(payload, status=code)
+
+    async def _read_photo(self, data, value):
+        """Возвращает список PhotoSize или None, если file_id неизвестен"""
+        # aiogram передаёт файлы как attach://<имя поля>
+        if isinstance(value, str) and value.startswith("attach://"):
+            value = data.get(value[len("attach://"):])
+        if isinstance(value, web.FileField):
+            self.uploads += 1
+            self.upload_bytes += len(value.file.read())
+            return self._new_photo()
+        if value in self.file_ids:
+            return [{"file_id": value, "file_unique_id": value, "width": 800, "height": 1200}]
+        self.rejected_file_ids += 1
+        return None
+
+    # ---------- методы Bot API ----------
+    async def get_me(self, data):
+        return self.ok({"id": 1, "is_bot": True, "first_name": "FakeTaro", "username": "fake_taro_bot"})
+
+    async def send_photo(self, data):
+        photo = await self._read_photo(data, data.get("photo"))
+        if photo is None:
+            return self.error(400, "Bad Request: wrong file identifier/HTTP URL specified")
+        return self.ok(self._message(data["chat_id"], photo=photo, caption=data.get("caption")))
+
+    async def send_media_group(self, data):
+        try:
+            media = json.loads(data.get("media", ""))
+        except ValueError:
+            return self.error(400, "Bad Request: can't parse media JSON object")
+        if not 2 <= len(media) <= 10:
+            return self.error(400, "Bad Request: wrong number of media in the album")
+        messages = []
+        for item in media:
+            photo = await self._read_photo(data, item.get("media"))
+            if photo is None:
+                return self.error(400, "Bad Request: wrong file identifier/HTTP URL specified")
+            messages.append(self._message(data["chat_id"], photo=photo, caption=item.get("caption"),
+                                          media_group_id="fake-album"))
+        return self.ok(messages)
+
+    async def send_message(self, data):
+        return self.ok(self._message(data["chat_id"], text=data.get("text", "")))
+
+    async def delete_message(self, data):
+        return self.ok(True)
+
+    async def edit_message_reply_markup(self, data):
+        return self.ok(self._message(data["chat_id"], text=""))
+
+    async def answer_callback_query(self, data):
+        return self.ok(True)
+
+    async def answer_inline_query(self, data):
+        self.inline_results += len(json.loads(data.get("results", "[]")))
+        return self.ok(True)
+
+    METHODS = {
+        "getme": get_me,
+        "sendphoto": send_photo,
+        "sendmediagroup": send_media_group,
+        "sendmessage": send_message,
+        "deletemessage": delete_message,
+        "editmessagereplymarkup": edit_message_reply_markup,
+        "answercallbackquery": answer_callback_query,
+        "answerinlinequery": answer_inline_query,
+    }
+
+    async def handle(self, request):
+        method = request.match_info["method"].lower()
+        self.calls[method] += 1
+        handler = self.METHODS.get(method)
+        if handler is None:
+            return self.error(404, f"Not Found: method {method} is not supported by fake API")
+        data = await request.post()
+        if method.startswith("send") and self.flood_rate and random.random() < self.flood_rate:
+            self.floods += 1
+            return self.error(429, f"Too Many Requests: retry after {self.retry_after}", retry_after=self.retry_after)
+        return await handler(self, data)
+
+    async def stats(self, request):
+        """Счётчики вызовов - для нагрузочных прогонов из другого процесса"""
+        return web.json_response({
+            "calls": dict(self.calls),
+            "total": sum(self.calls.values()),
+            "uploads": self.uploads,
+            "upload_bytes": self.upload_bytes,
+            "rejected_file_ids": self.rejected_file_ids,
+            "floods": self.floods,
+            "inline_results": self.inline_results,
+        })
+
+    def make_app(self):
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/_stats", self.stats)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фейковый Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля отправок, получающих 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    api = FakeBotAPI(flood_rate=args.flood_rate, retry_after=args.retry_after)
+    web.run_app(api.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Нагрузочные сценарии для бота на фейковом Bot API.
+
+Бот импортируется в этот же процесс, апдейты подаются прямо в
+диспетчер, а фейковый Bot API работает в отдельном процессе, чтобы не
+делить с ботом event loop. Для каждого сценария печатаются пропускная
+способность, p50/p99 времени обработки апдейта и расход памяти.
+
+--logging sync|queue включает логи бота в файл: прежний синхронный
+StreamHandler или очередь с отдельным потоком (logs.py). --slow-log-ms
+добавляет задержку на каждую запись в файл - так ведёт себя stderr,
+когда терминал или journald не успевают читать. С логами печатается,
+сколько времени event loop провёл внутри логирования: суммарно и самый
+долгий вызов.
+
+Запуск: python -m tools.loadtest --updates 5000 --users 20000 --groups 2000
+        python -m tools.loadtest --scenarios mixed --logging sync --slow-log-ms 1
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from tools.synthetic import UpdateFactory
+from tools.webhook_bench import free_port, wait_for_port
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Пропорции видов апдейтов в сценариях
+SCENARIOS = {
+    "mixed": {"tarot": 0.3, "card": 0.35, "spread": 0.05, "lang": 0.1, "help": 0.05, "stats": 0.1, "cards": 0.05},
+    "reveal": {"card": 1.0},
+    # Несколько человек жмут на одну рубашку
+    "mash": {"card": 0.25, "repeat": 0.75},
+    "spread": {"spread": 1.0},
+    "inline": {"inline": 1.0},
+    "tarot": {"tarot": 1.0},
+    "language": {"lang": 1.0},
+    "admin": {"stats": 0.5, "cards": 0.5},
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class SlowStream:
+    """Файл, запись в который занимает delay секунд - медленный приёмник логов"""
+
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def setup_bot_logging(args):
+    import logging
+
+    if args.logging == "off":
+        # Логи на каждый апдейт исказили бы замер
+        logging.disable(logging.INFO)
+        return
+    sink = SlowStream(open(args.log_file, "a", encoding="utf-8"), args.slow_log_ms / 1000)
+    if args.logging == "sync":
+        # Как было до logs.py: форматирование и запись прямо в event loop
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                            datefmt="%H:%M:%S", stream=sink, force=True)
+    else:
+        from logs import setup_logging
+        setup_logging(stream=sink)
+    print(f"Логи ({args.logging}) пишутся в {args.log_file}, задержка записи {args.slow_log_ms} мс")
+
+
+class LogTimer:
+    """Время, которое поток event loop проводит в обработчиках логов корневого логгера"""
+
+    def __init__(self):
+        import logging
+
+        self.calls = 0
+        self.total = 0.0
+        self.longest = 0.0
+        for handler in logging.getLogger().handlers:
+            handler.handle = self._timed(handler.handle)
+
+    def _timed(self, handle):
+        def timed_handle(record):
+            started = time.perf_counter()
+            try:
+                return handle(record)
+            finally:
+                spent = time.perf_counter() - started
+                self.calls += 1
+                self.total += spent
+                self.longest = max(self.longest, spent)
+        return timed_handle
+
+    def reset(self):
+        self.calls, self.total, self.longest = 0, 0.0, 0.0
+
+
+def rss_mb():
+    """Текущий RSS процесса; где нет /proc - пиковый"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_scenario(bot_module, name, mix, args, log_timer=None):
+    from aiogram.types import Update
+
+    factory = UpdateFactory(users=args.users, groups=args.groups, seed=args.seed)
+    # Апдейты собираем заранее, чтобы не мерить pydantic вместе с ботом
+    batch = [(kind, Update.model_validate(update, context={"bot": bot_module.bot}))
+             for kind, update in factory.batch(args.updates, mix)]
+
+    latencies = {}
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def feed(kind, update):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await bot_module.dp.feed_update(bot_module.bot, update)
+            except Exception:
+                errors += 1
+            latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+    rss_before = rss_mb()
+    if args.tracemalloc:
+        tracemalloc.start()
+    if log_timer is not None:
+        log_timer.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(kind, update) for kind, update in batch))
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    everything = [value for values in latencies.values() for value in values]
+    print(
+        f"{name:<9} {len(batch) / elapsed:>8.0f} апд/с  "
+        f"p50 {percentile(everything, 0.5) * 1000:>7.2f} мс  p99 {percentile(everything, 0.99) * 1000:>7.2f} мс  "
+        f"RSS {rss_mb():.1f} МБ (+{rss_mb() - rss_before:.1f})"
+        + (f"  пик Python-кучи {peak:.1f} МБ" if peak is not None else "")
+        + (f"  ошибок {errors}" if errors else "")
+    )
+    if args.verbose:
+        for kind, values in sorted(latencies.items()):
+            print(f"    {kind:<6} {len(values):>6}  p50 {percentile(values, 0.5) * 1000:>7.2f} мс  "
+                  f"p99 {percentile(values, 0.99) * 1000:>7.2f} мс")
+    print(f"          история: записей {len(bot_module.sampler)}, чатов {bot_module.sampler.active_chats}")
+    if log_timer is not None:
+        print(f"          логи в event loop: {log_timer.calls} вызовов, всего {log_timer.total * 1000:.1f} мс "
+              f"({log_timer.total / elapsed:.1%} времени), самый долгий {log_timer.longest * 1000:.2f} мс")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочные сценарии на фейковом Bot API")
+    parser.add_argument("--updates", type=int, default=5000, help="апдейтов на сценарий")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--groups", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="пик Python-кучи (заметно замедляет прогон)")
+    parser.add_argument("--verbose", action="store_true", help="задержки по видам апдейтов")
+    parser.add_argument("--logging", choices=["off", "sync", "queue"], default="off",
+                        help="логи бота: выключены, синхронно или через очередь")
+    parser.add_argument("--log-file", default=os.path.join(tempfile.gettempdir(), "taro-loadtest.log"))
+    parser.add_argument("--slow-log-ms", type=float, default=0, help="задержка записи каждой строки лога")
+    args = parser.parse_args()
+
+    api_port = free_port()
+    api_url = f"http://127.0.0.1:{api_port}"
+    os.environ.update(
+        BOT_TOKEN="123456:fake",
+        TELEGRAM_API_URL=api_url,
+        DATA_DIR=tempfile.mkdtemp(prefix="taro-load-"),
+        # Меряем сам бот, а не лимиты Telegram, паузу между /tarot и паузу перед открытием карты
+        SEND_SCHEDULER="0",
+        TAROT_COOLDOWN="0",
+        REVEAL_DELAY="0",
+    )
+    api = subprocess.Popen([sys.executable, "-m", "tools.fake_api", "--port", str(api_port)], cwd=ROOT,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await wait_for_port(api_port)
+        os.chdir(ROOT)
+        sys.path.insert(0, str(ROOT))
+        import bot as bot_module
+        setup_bot_logging(args)
+        log_timer = LogTimer() if args.logging != "off" else None
+        bot_module.create_app()
+
+        await bot_module.dp.emit_startup(bot=bot_module.bot)
+        print(f"CPU: {os.cpu_count()}, апдейтов на сценарий: {args.updates}, "
+              f"пользователей {args.users}, групп {args.groups}, параллельно {args.concurrency}")
+        try:
+            # Прогрев: загрузка картинок в фейковый API и заполнение кэша file_id
+            await run_scenario(bot_module, "прогрев", SCENARIOS["mixed"], argparse.Namespace(
+                **{**vars(args), "updates": 200, "tracemalloc": False, "verbose": False}))
+            for name in args.scenarios:
+                await run_scenario(bot_module, name, SCENARIOS[name], args, log_timer)
+        finally:
+            await bot_module.dp.emit_shutdown(bot=bot_module.bot)
+            await bot_module.bot.session.close()
+    finally:
+        api.terminate()
+        api.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""Микробенчмарки горячих функций бота.
+
+- get_unique_prediction_for_card - выбор предсказания без повторов;
+- get_card_of_the_day - карта и предсказание из хэша, без истории
+  (для сравнения с выбором случайной карты и предсказания без повторов);
+- каталог карт (бывшая get_available_cards): случайная карта и проверка
+  изменений папок, для сравнения - полная пересборка;
+- истечение истории (бывшая cleanup_old_predictions): PredictionSampler.expire
+  целиком и фоновая чистка sweep() порциями - с самой долгой паузой
+  event loop, которую она вызывает.
+
+Запуск: python -m tools.microbench --chats 10000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def report(name, seconds, operations):
+    per_op = seconds / operations
+    unit, scale = ("мкс", 1e6) if per_op < 1e-3 else ("мс", 1e3)
+    print(f"{name:<44} {per_op * scale:>10.2f} {unit}/оп  ({operations / seconds:,.0f} оп/с)")
+
+
+def bench(name, statement, number):
+    timer = timeit.Timer(statement)
+    # Лучший из трёх прогонов меньше зависит от соседей по машине
+    seconds = min(timer.repeat(repeat=3, number=number))
+    report(name, seconds, number)
+
+
+def bench_predictions(bot, chats, number):
+    cards = list(bot.catalog.cards)
+    chat_ids = [random.randrange(-10 ** 12, 10 ** 9) for _ in range(chats)]
+    draws = iter(range(10 ** 9))
+
+    def draw():
+        i = next(draws)
+        chat_id = chat_ids[i % len(chat_ids)]
+        bot.get_unique_prediction_for_card(cards[i % len(cards)], chat_id, chat_id)
+
+    bench("get_unique_prediction_for_card", draw, number)
+    print(f"{'':<44} история: записей {len(bot.sampler)}, чатов {bot.sampler.active_chats}")
+
+
+def bench_card_of_the_day(bot, chats, number):
+    user_ids = [random.randrange(1, 10 ** 10) for _ in range(chats)]
+    draws = iter(range(10 ** 9))
+
+    def history_path():
+        chat_id = user_ids[next(draws) % len(user_ids)]
+        bot.get_unique_prediction_for_card(bot.catalog.random_card(), chat_id, chat_id)
+
+    def daily_path():
+        bot.get_card_of_the_day(user_ids[next(draws) % len(user_ids)])
+
+    bench("random_card + без повторов (история)", history_path, number)
+    bench("get_card_of_the_day (хэш, без истории)", daily_path, number)
+
+
+def bench_catalog(bot, number):
+    catalog = bot.catalog
+    bench("catalog.random_card", catalog.random_card, number)
+    bench("catalog.refresh_if_changed (без изменений)", catalog.refresh_if_changed, number)
+    bench("catalog.rebuild (полная пересборка)", catalog.rebuild, max(1, number // 1000))
+
+
+def filled_sampler(entries, chats):
+    """Сэмплер, в котором устарела половина истории"""
+    from sampler import PredictionSampler
+
+    now = [0.0]
+    sampler = PredictionSampler(ttl=3600, clock=lambda: now[0])
+    cards = [f"card{i}" for i in range(22)]
+    for i in range(entries):
+        now[0] = i * 3600 / entries
+        sampler.draw(i % chats, cards[i % 22], "ru", 30)
+    now[0] = 3600 * 1.5
+    return sampler
+
+
+async def sweep_with_stall_probe(sampler):
+    """Чистка порциями плюс самая долгая пауза, которую увидел соседний таймер"""
+    longest = 0.0
+    done = False
+
+    async def probe():
+        nonlocal longest
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    expired = await sampler.sweep()
+    done = True
+    await task
+    return expired, longest
+
+
+def bench_expiry(entries, chats):
+    sampler = filled_sampler(entries, chats)
+    started = time.perf_counter()
+    expired = sampler.expire()
+    report(f"sampler.expire ({expired} из {entries} записей)", time.perf_counter() - started, 1)
+    report("sampler.expire (нечего удалять)", timeit.timeit(sampler.expire, number=10000), 10000)
+
+    sampler = filled_sampler(entries, chats)
+    expired, longest = asyncio.run(sweep_with_stall_probe(sampler))
+    report(f"sampler.sweep ({expired} записей, {sampler.last_sweep_slices} порций)", sampler.last_sweep_seconds, 1)
+    print(f"{'':<44} самая долгая пауза event loop: {longest * 1000:.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих функций бота")
+    parser.add_argument("--chats", type=int, default=10000)
+    parser.add_argument("--number", type=int, default=100000, help="вызовов на замер")
+    parser.add_argument("--expiry-entries", type=int, default=200000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("BOT_TOKEN", "123456:fake")
+    os.environ.setdefault("STORAGE", "memory")
+    os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="taro-micro-"))
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    import logging
+    logging.disable(logging.INFO)
+    import bot
+    bot.create_app()
+    asyncio.run(bot.load_resources())
+
+    bench_predictions(bot, args.chats, args.number)
+    bench_card_of_the_day(bot, args.chats, args.number)
+    bench_catalog(bot, args.number)
+    bench_expiry(args.expiry_entries, args.chats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Генератор синтетических апдейтов Telegram для нагрузочных прогонов"""
+import itertools
+import random
+
+# Сколько вызовов Bot API бот делает в ответ на апдейт каждого вида
+EXPECTED_CALLS = {
+    "tarot": 1,      # sendPhoto с рубашкой
+    "card": 3,       # answerCallbackQuery + delete/editReplyMarkup + sendPhoto
+    "repeat": 1,     # повторное нажатие на ту же рубашку: только answerCallbackQuery
+    "lang": 3,       # answerCallbackQuery + deleteMessage + sendMessage
+    "help": 1,       # sendMessage
+    "stats": 1,      # sendMessage
+    "cards": 1,      # sendMessage
+    "spread": 1,     # sendMediaGroup
+    "inline": 1,     # answerInlineQuery
+}
+
+DEFAULT_MIX = {"tarot": 0.35, "card": 0.45, "lang": 0.1, "help": 0.1}
+
+
+class UpdateFactory:
+    """Собирает JSON апдейтов для пользователей в личках и группах"""
+
+    def __init__(self, users=1000, groups=100, seed=None):
+        self.users = users
+        self.groups = groups
+        self.random = random.Random(seed)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._last_card_message = None
+
+    def _user(self):
+        user_id = self.random.randint(1, self.users)
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"}
+
+    def _chat(self, user):
+        # Примерно половина апдейтов приходит из групп
+        if self.groups and self.random.random() < 0.5:
+            group_id = -1000000000000 - self.random.randint(1, self.groups)
+            return {"id": group_id, "type": "supergroup", "title": f"group{-group_id}"}
+        return {"id": user["id"], "type": "private", "first_name": user["first_name"]}
+
+    def command(self, text):
+        user = self._user()
+        message_id = next(self._message_ids)
+        return {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": message_id,
+                "date": 0,
+                "chat": self._chat(user),
+                "from": user,
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+            },
+        }
+
+    def callback(self, data, message=None):
+        user = self._user()
+        update_id = next(self._update_ids)
+        if message is None:
+            message = {
+                "message_id": next(self._message_ids),
+                "date": 0,
+                "chat": self._chat(user),
+                "text": "🔮",
+            }
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "chat_instance": "synthetic",
+                "from": user,
+                "data": data,
+                "message": message,
+            },
+        }
+
+    def inline_query(self, query="tarot"):
+        update_id = next(self._update_ids)
+        return {
+            "update_id": update_id,
+            "inline_query": {"id": str(update_id), "from": self._user(), "query": query, "offset": ""},
+        }
+
+    def make(self, kind):
+        if kind == "tarot":
+            return self.command("/tarot")
+        if kind == "card":
+            update = self.callback(f"card_{self.random.randint(1, 4)}")
+            self._last_card_message = update["callback_query"]["message"]
+            return update
+        if kind == "repeat":
+            # Ещё одно нажатие на последнюю рубашку, как в шумной группе
+            if self._last_card_message is None:
+                raise ValueError("repeat идёт только после card")
+            return self.callback(f"card_{self.random.randint(1, 4)}", self._last_card_message)
+        if kind == "lang":
+            return self.callback(self.random.choice(["lang_ru", "lang_en"]))
+        if kind == "help":
+            return self.command("/help")
+        if kind == "spread":
+            return self.command(self.random.choice(["/spread", "/celtic"]))
+        if kind == "inline":
+            return self.inline_query()
+        if kind == "stats":
+            return self.command("/stats")
+        if kind == "cards":
+            return self.command("/cards")
+        raise ValueError(f"Неизвестный вид апдейта: {kind}")
+
+    def batch(self, count, mix=None):
+        """Список (вид, апдейт) в пропорциях mix"""
+        mix = mix or DEFAULT_MIX
+        kinds = self.random.choices(list(mix), weights=list(mix.values()), k=count)
+        updates = []
+        for kind in kinds:
+            if kind == "repeat" and self._last_card_message is None:
+                kind = "card"
+            updates.append((kind, self.make(kind)))
+        return updates
@@ -0,0 +1,122 @@
+"""Замер пропускной способности webhook-режима на фейковом Bot API.
+
+Поднимает tools.fake_api и webhook.py с разным числом воркеров,
+отправляет синтетические апдейты и считает, сколько апдейтов в секунду
+бот успевает полностью обработать (все ответные вызовы Bot API дошли
+до фейкового сервера).
+
+Запуск: python -m tools.webhook_bench --updates 2000 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+from tools.synthetic import EXPECTED_CALLS, UpdateFactory
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"Порт {port} так и не открылся")
+
+
+async def api_total(session, api_url):
+    async with session.get(f"{api_url}/_stats") as response:
+        return (await response.json())["total"]
+
+
+async def run_scenario(workers, updates, concurrency, seed):
+    api_port, webhook_port = free_port(), free_port()
+    api_url = f"http://127.0.0.1:{api_port}"
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123456:fake",
+        TELEGRAM_API_URL=api_url,
+        DATA_DIR=tempfile.mkdtemp(prefix="taro-bench-"),
+        PYTHONPATH=str(ROOT),
+        # Меряем сам бот, а не лимиты Telegram и паузу между /tarot
+        SEND_SCHEDULER="0",
+        TAROT_COOLDOWN="0",
+    )
+    api = subprocess.Popen([sys.executable, "-m", "tools.fake_api", "--port", str(api_port)], cwd=ROOT, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server = subprocess.Popen([sys.executable, "webhook.py", "--host", "127.0.0.1", "--port", str(webhook_port),
+                               "--workers", str(workers)], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await wait_for_port(api_port)
+        await wait_for_port(webhook_port)
+
+        batch = UpdateFactory(seed=seed).batch(updates)
+        expected = sum(EXPECTED_CALLS[kind] for kind, _ in batch)
+        url = f"http://127.0.0.1:{webhook_port}/webhook"
+
+        async with aiohttp.ClientSession() as session:
+            # Прогрев: первые загрузки фото и подключение воркеров
+            warm_up = UpdateFactory(seed=seed + 1).batch(20)
+            for _, update in warm_up:
+                async with session.post(url, json=update) as response:
+                    response.raise_for_status()
+            baseline = sum(EXPECTED_CALLS[kind] for kind, _ in warm_up)
+            while await api_total(session, api_url) < baseline:
+                await asyncio.sleep(0.1)
+            baseline = await api_total(session, api_url)
+
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def send(update):
+                async with semaphore:
+                    async with session.post(url, json=update) as response:
+                        response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(send(update) for _, update in batch))
+            while await api_total(session, api_url) - baseline < expected:
+                await asyncio.sleep(0.05)
+            elapsed = time.perf_counter() - started
+        return updates / elapsed
+    finally:
+        # Сначала бот, потом API: воркеры доотправляют ответы
+        for process in (server, api):
+            process.terminate()
+            process.wait(timeout=60)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность webhook-режима")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"CPU: {os.cpu_count()}, апдейтов на прогон: {args.updates}")
+    for workers in args.workers:
+        rate = await run_scenario(workers, args.updates, args.concurrency, args.seed)
+        print(f"воркеров {workers}: {rate:.0f} апдейтов/с")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
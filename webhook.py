@@ -0,0 +1,315 @@
+"""Webhook-режим бота с несколькими рабочими процессами.
+
+Один HTTP-слушатель принимает апдейты от Telegram и раздаёт их воркерам
+по chat_id, поэтому все апдейты одного чата (и его история без повторов)
+всегда обрабатывает один и тот же процесс. Языки пользователей воркеры
+делят через общее SQLite-хранилище.
+
+Запуск: python webhook.py --workers 4 --port 8080
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from logs import setup_logging
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/webhook"
+# Апдейты передаются воркеру по unix-сокету: 4 байта длины + JSON
+FRAME_HEADER = struct.Struct("!I")
+# Упавший воркер перезапускается не чаще, чем раз в столько секунд
+RESTART_DELAY = 5
+
+
+def chat_id_of(update):
+    """chat_id апдейта; для апдейтов без чата - id пользователя"""
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = value.get("from")
+        if user:
+            return user["id"]
+    return 0
+
+
+# ==================== ВОРКЕР ====================
+async def serve_worker(socket_path):
+    # Импортируем бота только в воркере: слушателю он не нужен
+    import bot as tarot_bot
+    from aiogram.types import Update
+
+    dp, bot = tarot_bot.create_app()
+    await dp.emit_startup(bot=bot)
+
+    in_flight = set()
+    connections = set()
+
+    async def process(update):
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            logger.error("Ошибка обработки апдейта %s: %s", update.update_id, e)
+
+    async def handle_connection(reader, writer):
+        connections.add(writer)
+        while True:
+            try:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                body = await reader.readexactly(FRAME_HEADER.unpack(header)[0])
+            except asyncio.IncompleteReadError:
+                break
+            update = Update.model_validate_json(body, context={"bot": bot})
+            task = asyncio.create_task(process(update))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        connections.discard(writer)
+        writer.close()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+
+    server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+    logger.info("👷 Воркер %s слушает %s", tarot_bot.config.worker_index, socket_path)
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        for writer in list(connections):
+            writer.close()
+        # Даём начатым раскладам доиграть, но не бесконечно (DRAIN_TIMEOUT);
+        # очередь отправки и снимок состояния - в on_shutdown бота
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=tarot_bot.config.drain_timeout)
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+
+def run_worker(index, count, socket_path):
+    # spawn: у воркера свой интерпретатор, логирование настраиваем заново
+    setup_logging()
+    os.environ["WORKER_INDEX"] = str(index)
+    os.environ["WORKER_COUNT"] = str(count)
+    asyncio.run(serve_worker(socket_path))
+
+
+# ==================== СЛУШАТЕЛЬ ====================
+class UpdateRouter:
+    """Раздаёт апдейты воркерам по chat_id.
+
+    Если соединение с воркером оборвалось, апдейты его чатов получают
+    503 - Telegram повторит их позже, - а роутер переподключается в фоне.
+    Упавший процесс перезапускает run_multi.
+    """
+
+    def __init__(self, socket_paths, secret_token=None):
+        self.socket_paths = socket_paths
+        self.secret_token = secret_token
+        self.writers = [None] * len(socket_paths)
+        self.routed = [0] * len(socket_paths)
+        self.unavailable = 0      # апдейтов, отклонённых с 503
+        self._reconnecting = {}   # {номер воркера: задача переподключения}
+        self._watchers = set()
+
+    async def _open(self, index, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_paths[index])
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if loop.time() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+        self.writers[index] = writer
+        # Воркер ничего не пишет в ответ: EOF значит, что соединение или процесс умерли
+        watcher = asyncio.create_task(self._watch(index, reader, writer))
+        self._watchers.add(watcher)
+        watcher.add_done_callback(self._watchers.discard)
+
+    async def _watch(self, index, reader, writer):
+        try:
+            await reader.read()
+        except OSError:
+            pass
+        if self.writers[index] is writer:
+            logger.error("❌ Соединение с воркером %s оборвалось", index)
+            self.reconnect(index)
+
+    async def connect(self, timeout=60):
+        for index in range(len(self.socket_paths)):
+            await self._open(index, timeout)
+        logger.info("✅ Подключено воркеров: %s", len(self.writers))
+
+    def reconnect(self, index, timeout=60):
+        """Переподключение к воркеру в фоне; повторный вызов не начинает вторую попытку"""
+        task = self._reconnecting.get(index)
+        if task is None:
+            task = self._reconnecting[index] = asyncio.create_task(self._reconnect(index, timeout))
+            task.add_done_callback(lambda _: self._reconnecting.pop(index, None))
+        return task
+
+    async def _reconnect(self, index, timeout):
+        writer, self.writers[index] = self.writers[index], None
+        if writer is not None:
+            writer.close()
+        try:
+            await self._open(index, timeout)
+        except OSError as e:
+            logger.error("❌ Воркер %s недоступен: %s", index, e)
+            return
+        logger.info("🔌 Воркер %s снова подключён", index)
+
+    def _unavailable(self, index):
+        self.unavailable += 1
+        self.reconnect(index)
+        return web.Response(status=503)
+
+    async def handle(self, request):
+        if self.secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret_token:
+            return web.Response(status=401)
+        body = await request.read()
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+
+        index = chat_id_of(update) % len(self.writers)
+        writer = self.writers[index]
+        if writer is None or writer.is_closing():
+            return self._unavailable(index)
+        try:
+            writer.write(FRAME_HEADER.pack(len(body)) + body)
+            await writer.drain()
+        except OSError as e:
+            logger.error("❌ Воркер %s не принял апдейт: %s", index, e)
+            return self._unavailable(index)
+        self.routed[index] += 1
+        return web.Response()
+
+    async def close(self):
+        for task in [*self._reconnecting.values(), *self._watchers]:
+            task.cancel()
+        writers, self.writers = self.writers, [None] * len(self.writers)
+        for writer in writers:
+            if writer is not None:
+                writer.close()
+
+
+async def set_webhook(token, url, secret_token):
+    from aiogram import Bot
+
+    bot = Bot(token=token)
+    try:
+        await bot.set_webhook(url, secret_token=secret_token, drop_pending_updates=False)
+        logger.info("🔗 Webhook установлен: %s", url)
+    finally:
+        await bot.session.close()
+
+
+def run_single(host, port, secret_token):
+    """Один процесс: стандартная интеграция aiogram с aiohttp"""
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    import bot as tarot_bot
+
+    dp, bot = tarot_bot.create_app()
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret_token).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    web.run_app(app, host=host, port=port, print=None)
+
+
+def run_multi(workers, host, port, secret_token):
+    socket_dir = Path(tempfile.mkdtemp(prefix="taro-workers-"))
+    socket_paths = [str(socket_dir / f"worker{i}.sock") for i in range(workers)]
+
+    # spawn, а не fork: воркеры не наследуют состояние слушателя
+    context = multiprocessing.get_context("spawn")
+
+    def spawn(index):
+        process = context.Process(target=run_worker, args=(index, workers, socket_paths[index]),
+                                  name=f"taro-worker-{index}")
+        process.start()
+        return process
+
+    processes = [spawn(i) for i in range(workers)]
+    started_at = [time.monotonic()] * workers
+    router = UpdateRouter(socket_paths, secret_token)
+    supervisor = []
+
+    async def supervise():
+        """Упавший воркер перезапускается с тем же номером и сокетом"""
+        while True:
+            await asyncio.sleep(1)
+            for index, process in enumerate(processes):
+                if process.is_alive() or time.monotonic() - started_at[index] < RESTART_DELAY:
+                    continue
+                logger.error("💥 Воркер %s завершился с кодом %s, перезапускаем", index, process.exitcode)
+                process.join()
+                processes[index] = spawn(index)
+                started_at[index] = time.monotonic()
+                router.reconnect(index)
+
+    async def on_startup(app):
+        await router.connect()
+        supervisor.append(asyncio.create_task(supervise()))
+
+    async def on_cleanup(app):
+        # Сначала супервизор: остановленные воркеры перезапускать не нужно
+        for task in supervisor:
+            task.cancel()
+        await router.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=30)
+        logger.info("📊 Апдейтов по воркерам: %s", router.routed)
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, router.handle)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    web.run_app(app, host=host, port=port, print=None)
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Бот Таро в режиме webhook")
+    parser.add_argument("--host", default=os.getenv("WEBHOOK_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEBHOOK_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEBHOOK_WORKERS", "1")))
+    args = parser.parse_args()
+
+    setup_logging()
+
+    secret_token = os.getenv("WEBHOOK_SECRET")
+    webhook_url = os.getenv("WEBHOOK_URL")
+    if webhook_url:
+        asyncio.run(set_webhook(os.getenv("BOT_TOKEN"), webhook_url + WEBHOOK_PATH, secret_token))
+
+    if args.workers > 1:
+        run_multi(args.workers, args.host, args.port, secret_token)
+    else:
+        run_single(args.host, args.port, secret_token)
+
+
+if __name__ == "__main__":
+    main()